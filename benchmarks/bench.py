@@ -0,0 +1,498 @@
+"""Benchmarks for the dictionary engines
+
+Run from the root of the repository:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --save-baseline baseline.json
+    python benchmarks/bench.py --baseline baseline.json
+
+Timings depend on the machine, so no baseline is shipped: save one before
+a change, then compare against it after the change, on the same machine.
+
+The engines are imported directly (as `edict2` and `romkan`) so that Anki
+does not need to be installed. The dictionary files are the ones shipped
+with the add-on (see the `package` target of the Makefile).
+
+The import time is that of the engines only (see IMPORT_BUDGET_S), not of
+the add-on, which cannot be imported without Anki.
+
+Results are written as JSON. When a baseline is given, every metric is
+compared against it and the script exits with a non-zero status if any of
+them got slower (or bigger) by more than the tolerance. Counts (see
+COUNT_METRICS) are compared exactly, and only when the baseline was made
+with the same dictionary.
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterable
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'japanote'))
+
+Metrics = dict[str, float]
+
+# importing the engines must stay cheap since it happens on Anki's GUI thread;
+# the dictionaries themselves are only loaded on first use. The budget only
+# covers these modules: the add-on itself (japanote/__init__.py) needs Anki
+# to be imported, so it is not measured; it imports nothing but anki and aqt
+# at startup, and the engines when the user first interacts with it
+IMPORT_BUDGET_S = 0.05
+ENGINE_MODULES = ['edict2.search', 'edict2.deinflect', 'edict2.furigana', 'edict2.kanji', 'edict2.trace']
+
+# numbers of things rather than costs; they only change with the dictionary
+# or the results of lookups
+COUNT_METRICS = {'edict_keys', 'inflections_forms', 'inflections_mismatch'}
+# rates rather than costs, for which higher is better
+RATE_SUFFIX = '_per_s'
+
+# fixed corpus of queries; mix of dictionary forms, inflected forms, kanji,
+# katakana and words that are not in the dictionary
+SEARCH_CORPUS = [
+    'たべる', '食べる', 'のむ', '飲む', 'いく', '行く', 'くる', '来る', 'たかい', '高い',
+    'べんきょう', '勉強', 'ぎゅうにく', '牛肉', 'わたし', '私', 'あんき', 'アンキ', 'にほん', '日本',
+    'ひがえり', '日帰り', 'などなど', '等々', 'ねこ', '猫', 'いぬ', '犬', 'みず', '水',
+    'xyz', 'ぬぬぬぬぬ', 'ん', 'あ', '学生', 'せんせい', '先生', 'やま', '山', 'かわ',
+]
+DEINFLECT_CORPUS = [
+    'たべる', 'たべた', 'たべなかった', 'たべさせられる', 'たべませんでした', 'たべたい', 'たべれば',
+    'のんだ', 'のまない', 'のみました', 'のめる', 'いった', 'いかなければ', 'きた', 'こない',
+    'たかかった', 'たかくない', 'たかければ', 'べんきょうした', 'べんきょうしている', 'しなさい',
+    'よんでいます', 'かいてしまった', 'みせてください', 'ねこ', 'あ',
+]
+FURIGANA_CORPUS = [
+    ('私', 'わたし'),
+    ('牛肉', 'ぎゅうにく'),
+    ('一二三四五六七八九十', 'いちにさんしごろくななはちきゅうじゅう'),
+    ('等々', 'などなど'),
+    ('日帰り', 'ひがえり'),
+    ('判官', 'はんがん'),
+    ('贔屓', 'ひいき'),
+    ('判官贔屓', 'はんがんびいき'),
+    ('勉強', 'べんきょう'),
+    ('食べる', 'たべる'),
+    ('学生', 'がくせい'),
+    ('日本語', 'にほんご'),
+]
+ROMAJI_CORPUS = [
+    'anki', 'taberu', 'tabemasendeshita', 'nihongo', 'benkyou', 'gyuuniku', 'kitte', 'shinbun',
+    "kon'nichiha", 'ryokou', 'chotto', 'watashi', 'toukyou', 'sayounara', 'あんき', 'tabeたい',
+]
+
+
+def measure(function: Callable[[], Any], repeat: int) -> float:
+    """Return the best time in seconds out of `repeat` calls to `function`"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_item(function: Callable[[Any], Any], corpus: Iterable[Any], repeat: int) -> float:
+    """Return the best average time in microseconds of `function` over `corpus`"""
+    items = list(corpus)
+
+    def run() -> None:
+        for item in items:
+            function(item)
+    return measure(run, repeat) / len(items) * 1e6
+
+
+def max_rss_kib() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024  # bytes on macOS
+    return float(rss)
+
+
+def _load_edict(filename: str, queue: 'multiprocessing.Queue[Metrics]') -> None:
+    from edict2.search import Edict
+
+    rss_before = max_rss_kib()
+    start = time.perf_counter()
+    edict = Edict(filename)
+    elapsed = time.perf_counter() - start
+    rss_after = max_rss_kib()
+    queue.put({
+        'edict_load_s': elapsed,
+        'edict_load_rss_mib': (rss_after - rss_before) / 1024,
+        'edict_keys': float(len(edict.words)),
+    })
+
+
+def bench_load(filename: str) -> Metrics:
+    # load in a fresh process so that RSS is not polluted by other benchmarks
+    context = multiprocessing.get_context('spawn')
+    queue: multiprocessing.Queue[Metrics] = context.Queue()
+    process = context.Process(target=_load_edict, args=(filename, queue))
+    process.start()
+    metrics = queue.get()
+    process.join()
+    return metrics
+
+
+def bench_blocks(filename: str, repeat: int) -> Metrics:
+    from edict2.search import CompressedEdict
+
+    # compressed copy made by `make blocks`
+    blocks_filename = filename + '.blk'
+    if not os.path.exists(blocks_filename):
+        return {}
+    edict = CompressedEdict(blocks_filename)
+
+    def search_cold(word: str) -> None:
+        # the blocks decoded by the previous repetition are dropped
+        edict.blocks.cache.clear()
+        list(edict.search(word))
+
+    return {
+        'blocks_size_mib': os.path.getsize(blocks_filename) / 2**20,
+        'blocks_load_s': measure(lambda: CompressedEdict(blocks_filename), max(1, repeat // 4)),
+        'blocks_search_us': per_item(search_cold, SEARCH_CORPUS, repeat),
+    }
+
+
+def bench_keys(filename: str, repeat: int) -> Metrics:
+    from edict2 import memory
+    from edict2.index import load_index
+    from edict2.search import Edict, load
+
+    # key index made by `make keys`, for the compiled index made by `make index`
+    keys_filename = filename + '.keys'
+    index_filename = filename + '.idx'
+    if not os.path.exists(keys_filename) or not os.path.exists(index_filename):
+        return {}
+    index = load_index(index_filename)
+    if index is None:
+        return {}
+    in_memory = Edict.from_index(index)
+    # as loaded by search.load: the keys are only in the key index, and the
+    # entries in the compressed copy when it is up to date (`make blocks`)
+    mapped = load(filename)
+    if mapped.key_index is None:
+        return {}
+    keys = list(index.keys)[::max(1, len(index.keys) // 1000)]
+    return {
+        'keys_size_mib': os.path.getsize(keys_filename) / 2**20,
+        'keys_edict_mib': memory.deep_size(mapped)[1] / 2**20,
+        'dict_edict_mib': memory.deep_size(in_memory)[1] / 2**20,
+        'keys_search_us': per_item(lambda key: list(mapped.search(key)), keys, repeat),
+        'dict_search_us': per_item(lambda key: list(in_memory.search(key)), keys, repeat),
+    }
+
+
+def bench_inflections(filename: str, repeat: int) -> Metrics:
+    from edict2 import inflections, lookup
+
+    # index of inflected forms made by `make inflections`
+    inflections_filename = filename + '.inf'
+    if not os.path.exists(inflections_filename):
+        return {}
+    index = inflections.InflectionIndex(inflections_filename)
+
+    def lookup_with(index: Optional[inflections.InflectionIndex]) -> Callable[[str], list[Any]]:
+        def run(word: str) -> list[Any]:
+            inflections.inflections = index
+            inflections.looked_for_inflections = True
+            return list(lookup.lookup(word))
+        return run
+
+    with_index = [{word.edict_entry for word in lookup_with(index)(form)} for form in DEINFLECT_CORPUS]
+    without_index = [{word.edict_entry for word in lookup_with(None)(form)} for form in DEINFLECT_CORPUS]
+    metrics = {
+        'inflections_size_mib': os.path.getsize(inflections_filename) / 2**20,
+        'inflections_forms': float(len(index)),
+        'inflections_get_us': per_item(index.get, DEINFLECT_CORPUS, repeat),
+        'lookup_inflections_us': per_item(lookup_with(index), DEINFLECT_CORPUS, repeat),
+        'lookup_deinflector_us': per_item(lookup_with(None), DEINFLECT_CORPUS, repeat),
+        # share of the corpus for which the strategies give different entries
+        'inflections_mismatch': sum(a != b for a, b in zip(with_index, without_index)) / len(DEINFLECT_CORPUS),
+    }
+    inflections.inflections = None
+    inflections.looked_for_inflections = False
+    return metrics
+
+
+def bench_import(repeat: int) -> Metrics:
+    # each import needs a fresh interpreter
+    script = (
+        'import time\n'
+        'start = time.perf_counter()\n'
+        f'import {", ".join(ENGINE_MODULES)}\n'
+        'print(time.perf_counter() - start)\n'
+    )
+    addon = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'japanote')
+    timings = [
+        float(subprocess.run([sys.executable, '-c', script], cwd=addon, capture_output=True, check=True).stdout)
+        for _ in range(max(1, repeat // 4))
+    ]
+    return {'engines_import_s': min(timings)}
+
+
+def bench_search(repeat: int) -> Metrics:
+    from edict2.search import get_edict
+
+    edict = get_edict()
+    return {
+        'edict_search_us': per_item(lambda word: list(edict.search(word)), SEARCH_CORPUS, repeat),
+    }
+
+
+def bench_complete(repeat: int) -> Metrics:
+    from edict2.complete import build_completer
+    from edict2.search import get_edict
+
+    edict = get_edict()
+    start = time.perf_counter()
+    completer = build_completer(edict)
+    build_s = time.perf_counter() - start
+    # every prefix of the corpus, from one character (the largest ranges) on
+    prefixes = list(dict.fromkeys(word[:i] for word in SEARCH_CORPUS for i in range(1, len(word) + 1)))
+    return {
+        'complete_build_s': build_s,
+        'complete_us': per_item(completer.complete, prefixes, repeat),
+        'complete_first_character_us': per_item(completer.complete, [word[0] for word in SEARCH_CORPUS], repeat),
+    }
+
+
+def bench_coverage(repeat: int) -> Metrics:
+    from edict2.coverage import Scanner
+
+    start = time.perf_counter()
+    scanner = Scanner()
+    setup_s = time.perf_counter() - start
+    # sentences made of the corpus, joined by particles and inflected forms
+    texts = [
+        '<div>' + 'は'.join(SEARCH_CORPUS[i:i + 5]) + 'を' + DEINFLECT_CORPUS[i % len(DEINFLECT_CORPUS)] + '。</div>'
+        for i in range(len(SEARCH_CORPUS))
+    ]
+
+    def scan(text: str) -> None:
+        scanner.cache.clear()  # each text scanned cold
+        for _ in scanner.scan(text):
+            pass
+    return {
+        'coverage_setup_s': setup_s,
+        'coverage_scan_us': per_item(scan, texts, repeat),
+    }
+
+
+def bench_deinflect(repeat: int) -> Metrics:
+    from edict2.deinflect import Deinflector
+
+    deinflector = Deinflector()
+    return {
+        'deinflector_init_s': measure(Deinflector, repeat),
+        'deinflect_us': per_item(lambda word: list(deinflector(word)), DEINFLECT_CORPUS, repeat),
+    }
+
+
+def bench_furigana(repeat: int) -> Metrics:
+    from edict2 import furigana
+    from edict2.kanji import load_kanjidic
+
+    metrics = {'load_kanjidic_s': measure(load_kanjidic, max(1, repeat // 10))}
+    furigana.get_kanjidic()
+    metrics['match_from_kanji_kana_us'] = per_item(
+        lambda pair: list(furigana.match_from_kanji_kana(*pair)), FURIGANA_CORPUS, repeat,
+    )
+    metrics['furigana_from_kanji_kana_us'] = per_item(
+        lambda pair: furigana.furigana_from_kanji_kana(*pair), FURIGANA_CORPUS, repeat,
+    )
+    return metrics
+
+
+def bench_prepare(repeat: int) -> Metrics:
+    from edict2.prepare import prepare_words
+    from edict2.search import get_edict
+
+    words = [word for _, word in zip(range(1000), get_edict().entries())]
+
+    def prepare() -> None:
+        for word in words:
+            word._furigana = None
+            word._meanings_html = None
+        prepare_words(words)
+
+    return {'prepare_words_us': measure(prepare, max(1, repeat // 10)) / len(words) * 1e6}
+
+
+def bench_romkan(repeat: int) -> Metrics:
+    import romkan
+
+    return {
+        'romkan_to_hiragana_us': per_item(romkan.to_hiragana, ROMAJI_CORPUS, repeat),
+    }
+
+
+def bench_build(filename: str, processes: list[int]) -> Metrics:
+    from edict2.build import build
+
+    # a single run each; building takes several seconds
+    return {f'build_{n}_processes_s': measure(functools.partial(build, filename, n), 1) for n in processes}
+
+
+def bench_jmdict(filename: str) -> Metrics:
+    from edict2.jmdict import iter_words
+
+    start = time.perf_counter()
+    n_entries = sum(1 for _ in iter_words(filename))
+    elapsed = time.perf_counter() - start
+
+    # separate run since tracing allocations slows parsing down
+    tracemalloc.start()
+    for _ in iter_words(filename):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'jmdict_parse_s': elapsed,
+        'jmdict_parse_mib_per_s': os.path.getsize(filename) / elapsed / 2**20,
+        'jmdict_entries_per_s': n_entries / elapsed,
+        'jmdict_parse_peak_mib': peak / 2**20,
+    }
+
+
+def bench_memory(filename: str) -> Metrics:
+    from edict2 import memory
+    from edict2.search import Edict
+
+    # deep sizes of the structures loaded by the other benchmarks
+    metrics = {}
+    for usage in memory.measure():
+        metrics[f'{usage.name}_mib'] = usage.bytes / 2**20
+        metrics[f'{usage.name}_objects'] = float(usage.objects)
+    loaded = []  # keep the dictionary alive until the end of the trace
+    load_trace = memory.trace_load('edict', lambda: loaded.append(Edict(filename)))
+    metrics['edict_load_traced_mib'] = load_trace.current / 2**20
+    metrics['edict_load_traced_peak_mib'] = load_trace.peak / 2**20
+    return metrics
+
+
+def compare(results: Metrics, baseline: Metrics, tolerance: float, same_dictionary: bool) -> list[str]:
+    """Return the descriptions of the metrics that regressed
+
+    Counts are only compared (exactly) when the baseline was made with the
+    same dictionary; they are expected to change with another one.
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if name in COUNT_METRICS:
+            if not same_dictionary:
+                continue
+            status = 'CHANGED' if value != reference else 'ok'
+            print(f'{name:32} {reference:12.0f} -> {value:12.0f}          {status}', file=sys.stderr)
+            if value != reference:
+                regressions.append(name)
+            continue
+        if not reference or not value:
+            continue
+        # how many times worse, whether lower or higher is better
+        ratio = reference / value if name.endswith(RATE_SUFFIX) else value / reference
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f'{name:32} {reference:12.3f} -> {value:12.3f} ({ratio:6.2f}x) {status}', file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def run_benchmarks(args: argparse.Namespace) -> Metrics:
+    results: Metrics = {}
+    results.update(bench_import(args.repeat))
+    results.update(bench_load(args.edict))
+    results.update(bench_search(args.repeat))
+    results.update(bench_complete(args.repeat))
+    results.update(bench_coverage(args.repeat))
+    results.update(bench_blocks(args.edict, args.repeat))
+    results.update(bench_keys(args.edict, args.repeat))
+    results.update(bench_inflections(args.edict, args.repeat))
+    results.update(bench_deinflect(args.repeat))
+    results.update(bench_furigana(args.repeat))
+    results.update(bench_prepare(args.repeat))
+    results.update(bench_romkan(args.repeat))
+    if args.memory:
+        results.update(bench_memory(args.edict))
+    if args.build:
+        results.update(bench_build(args.edict, args.build))
+    if args.jmdict:
+        results.update(bench_jmdict(args.jmdict))
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    from edict2.search import default_edict
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--edict', default=default_edict, help='EDICT2 file used for the load benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='number of repetitions (best is kept)')
+    parser.add_argument('--output', help='write results to this JSON file (default: standard output)')
+    parser.add_argument('--baseline', help='compare results against this JSON file')
+    parser.add_argument('--save-baseline', help='write results to this JSON file for later comparisons')
+    parser.add_argument('--build', type=lambda arg: [int(n) for n in arg.split(',')], metavar='N,N,...',
+                        help='also time building the index of EDICT with these numbers of processes')
+    parser.add_argument('--memory', action='store_true',
+                        help='also report the memory used by the loaded structures (slow)')
+    parser.add_argument('--jmdict', help='also time parsing this JMdict or JMnedict XML file')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_S,
+                        help=f'seconds allowed to import the engines, not the add-on (default: {IMPORT_BUDGET_S})')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'edict': os.path.basename(args.edict),
+            'edict_size': os.path.getsize(args.edict),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(output + '\n')
+
+    if results['engines_import_s'] > args.import_budget:
+        print(f'importing the engines took {results["engines_import_s"]:.3f} s (budget: {args.import_budget} s)',
+              file=sys.stderr)
+        return 1
+
+    if results.get('inflections_mismatch', 0) > 0:
+        print(f'lookups with the index of inflections differ for {results["inflections_mismatch"]:.1%} of the corpus',
+              file=sys.stderr)
+        return 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        same_dictionary = all(baseline['meta'].get(key) == report['meta'][key] for key in ('edict', 'edict_size'))
+        regressions = compare(results, baseline['results'], args.tolerance, same_dictionary)
+        if regressions:
+            print(f'{len(regressions)} regression(s): {", ".join(regressions)}', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
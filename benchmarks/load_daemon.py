@@ -0,0 +1,97 @@
+"""Load test of the lookup daemon
+
+Run from the root of the repository:
+
+    python benchmarks/load_daemon.py --clients 50 --requests 200
+
+A daemon is started on a temporary socket (unless --socket is given) and
+many concurrent clients send search requests from the benchmark corpus.
+Throughput and latency percentiles are written as JSON.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from bench import DEINFLECT_CORPUS, SEARCH_CORPUS
+
+addon = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'japanote')
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    latencies = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e3
+
+    return {
+        'latency_p50_ms': percentile(.50),
+        'latency_p90_ms': percentile(.90),
+        'latency_p99_ms': percentile(.99),
+        'latency_max_ms': latencies[-1] * 1e3,
+    }
+
+
+async def run_client(path: str, n_requests: int, offset: int, latencies: list[float]) -> None:
+    # responses to short queries can be large
+    reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+    words = itertools.islice(itertools.cycle(SEARCH_CORPUS + DEINFLECT_CORPUS), offset, None)
+    for request_id, word in zip(range(n_requests), words):
+        request = {'id': request_id, 'method': 'search', 'params': {'word': word}}
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        assert response['id'] == request_id, response
+        assert 'result' in response, response
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(path: str, n_clients: int, n_requests: int) -> dict[str, float]:
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(path, n_requests, i, latencies) for i in range(n_clients)))
+    elapsed = time.perf_counter() - start
+    return {'requests_per_s': len(latencies) / elapsed, **percentiles(latencies)}
+
+
+def start_daemon(path: str) -> subprocess.Popen[bytes]:
+    daemon = subprocess.Popen([sys.executable, '-m', 'edict2.server', '--socket', path], cwd=addon)
+    while not os.path.exists(path):
+        if daemon.poll() is not None:
+            sys.exit('the lookup daemon exited')
+        time.sleep(.1)
+    return daemon
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Load test of the lookup daemon')
+    parser.add_argument('--socket', help='socket of a running daemon (default: start one)')
+    parser.add_argument('--clients', type=int, default=50, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests per client')
+    args = parser.parse_args(argv)
+
+    daemon = None
+    path = args.socket
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'japanote.sock')
+        daemon = start_daemon(path)
+    try:
+        results = asyncio.run(load_test(path, args.clients, args.requests))
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+    print(json.dumps({'clients': args.clients, 'requests': args.requests, 'results': results}, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Load test of the local HTTP API
+
+Run from the root of the repository:
+
+    python benchmarks/load_http.py --clients 50 --requests 200 --batch 1
+
+The API is started in this process (without Anki, so notes cannot be added)
+and many concurrent clients send search requests from the benchmark corpus
+over keep-alive connections, with --batch queries per request. Throughput and
+latency percentiles are written as JSON.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Optional
+
+from bench import DEINFLECT_CORPUS, ROMAJI_CORPUS, SEARCH_CORPUS
+from load_daemon import percentiles
+
+
+async def run_client(port: int, n_requests: int, batch: int, offset: int, latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2**24)
+    corpus = SEARCH_CORPUS + DEINFLECT_CORPUS + ROMAJI_CORPUS
+    patterns = itertools.islice(itertools.cycle(corpus), offset, None)
+    for _ in range(n_requests):
+        body = json.dumps({'queries': list(itertools.islice(patterns, batch))}).encode()
+        start = time.perf_counter()
+        writer.write(
+            b'POST /search HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'
+            + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body,
+        )
+        await writer.drain()
+        status = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.lower()] = value.strip()
+        response = json.loads(await reader.readexactly(int(headers['content-length'])))
+        latencies.append(time.perf_counter() - start)
+        assert status.startswith(b'HTTP/1.1 200'), (status, response)
+        assert len(response['results']) == batch, response
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(port: int, n_clients: int, n_requests: int, batch: int) -> dict[str, float]:
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, n_requests, batch, i, latencies) for i in range(n_clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_s': len(latencies) / elapsed,
+        'queries_per_s': len(latencies) * batch / elapsed,
+        **percentiles(latencies),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Load test of the local HTTP API')
+    parser.add_argument('--clients', type=int, default=50, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests per client')
+    parser.add_argument('--batch', type=int, default=1, help='number of queries per request')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker threads of the API')
+    args = parser.parse_args(argv)
+
+    # importing bench put the add-on on sys.path
+    import romkan
+    from edict2.furigana import get_kanjidic
+    from edict2.httpapi import HttpApi
+    from edict2.lookup import get_deinflector, lookup
+    from edict2.search import Word, get_edict, get_enamdict
+
+    def search(pattern: str, is_proper_noun: bool) -> list[Word]:
+        return list(lookup(romkan.to_hiragana(pattern), is_proper_noun))
+
+    # load everything before measuring
+    get_edict()
+    get_enamdict()
+    get_deinflector()
+    get_kanjidic()
+
+    # every client may have a request waiting
+    api = HttpApi(search, workers=args.workers, max_pending=args.clients)
+    port = api.start()
+    try:
+        results = asyncio.run(load_test(port, args.clients, args.requests, args.batch))
+    finally:
+        api.stop()
+    summary = {'clients': args.clients, 'requests': args.requests, 'batch': args.batch, 'workers': args.workers}
+    print(json.dumps({**summary, 'results': results}, indent=4))
+
+
+if __name__ == '__main__':
+    main()
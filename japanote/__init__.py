@@ -1,16 +1,16 @@
+import json
+import sys
 from typing import Callable, TypeVar
 
 from anki.hooks import wrap
-from aqt import mw
+from aqt import gui_hooks, mw
 from aqt.deckbrowser import DeckBrowser
 from aqt.qt import QObject, pyqtSlot
 from aqt.utils import showInfo
 
-from .model import add_notes, word_search
-from .searchwindow import SearchWindow
-from .settingswindow import SettingsWindow
-from .view import refresh_deckBrowser
-
+# NOTE: the rest of the add-on (dictionaries, windows, romaji conversion) is
+# only imported when the user first interacts with it to keep Anki's startup
+# fast
 
 T = TypeVar('T')
 
@@ -18,24 +18,35 @@ T = TypeVar('T')
 class JavaScriptBridge(QObject):
     @pyqtSlot(str)
     @pyqtSlot(str, bool)
-    def quickAdd(self, pattern: str, is_proper_noun: bool = False) -> int:
-        pattern = pattern.strip()
-        if not pattern:
-            return 0
-        word_search.is_proper_noun = is_proper_noun
-        word_search.search(pattern)
-        if not word_search.words:
-            showInfo('No word found')
+    def quickAdd(self, text: str, is_proper_noun: bool = False) -> int:
+        """Add the words of text (one or more patterns) and review the ambiguous ones"""
+        from .model import add_notes
+        from .searchwindow import SearchWindow
+        from .service import search_service, split_patterns
+
+        patterns = split_patterns(text)
+        if not patterns:
             return 0
-        elif len(word_search.words) > 1:
-            SearchWindow.open(pattern)
-            return 1
-        else:
-            add_notes(word_search.words)
-            return 1
+        words, ambiguous, not_found = search_service.resolve(patterns, is_proper_noun)
+        if not_found:
+            showInfo('No word found' if len(patterns) == 1 else 'No word found for: ' + '、'.join(not_found))
+        if words:
+            add_notes(words)
+        if ambiguous:
+            SearchWindow.open(ambiguous[0], ambiguous[1:], is_proper_noun)
+        return int(bool(words or ambiguous))
+
+    @pyqtSlot(str, result=str)
+    def complete(self, text: str) -> str:
+        """Return the suggestions (JSON) for the pattern being typed at the end of text"""
+        from .service import search_service
+
+        return json.dumps(search_service.complete(text))
 
     @pyqtSlot()
     def showSettings(self) -> None:
+        from .settingswindow import SettingsWindow
+
         SettingsWindow.open()
 
 
@@ -46,7 +57,17 @@ def render(self: DeckBrowser, _old: Callable[[DeckBrowser], str]) -> str:
     return _old(self) + """
     <fieldset style="width:500px; margin:30px 0 30px 0">
         <legend>JapaNote: create a note for a Japanese word</legend>
-        <input style="height:2em; box-sizing:border-box; width:100%; margin:5px; padding:5px;" type="text" id="quick-add-pattern" placeholder="あんき" autofocus>
+        <div style="position:relative">
+            <textarea
+                style="height:2.4em; box-sizing:border-box; width:100%; margin:5px; padding:5px; resize:vertical;"
+                id="quick-add-pattern"
+                placeholder="あんき (several words can be separated by spaces, commas or new lines)"
+                autocomplete="off" autofocus></textarea>
+            <div
+                id="quick-add-suggestions"
+                style="display:none; position:absolute; z-index:1; left:5px; right:-5px; text-align:left;
+                    background:white; color:black; border:1px solid gray; cursor:pointer"></div>
+        </div>
         <button onclick="edict.quickAdd(quickAddPattern.value);" style="border:2px solid black">Add Word</button>
         <button onclick="edict.quickAdd(quickAddPattern.value, true)">Add Proper Noun</button>
         <button onclick="edict.showSettings()">Settings</button>
@@ -61,14 +82,97 @@ def render(self: DeckBrowser, _old: Callable[[DeckBrowser], str]) -> str:
         })}, 100);
     }
     const quickAddPattern = document.getElementById('quick-add-pattern');
+    const quickAddSuggestions = document.getElementById('quick-add-suggestions');
+    let suggestions = [];
+    let selectedSuggestion = -1;
+    function showSuggestions(result) {
+        suggestions = JSON.parse(result);
+        selectedSuggestion = -1;
+        quickAddSuggestions.replaceChildren(...suggestions.map(function(suggestion, i) {
+            const item = document.createElement('div');
+            item.style.padding = '2px 5px';
+            const kana = suggestion.kana ? ' 【' + suggestion.kana + '】' : '';
+            item.textContent = suggestion.key + kana + ' ' + suggestion.meaning;
+            // mousedown, so that the text area keeps the focus
+            item.addEventListener('mousedown', function(event) {
+                event.preventDefault();
+                acceptSuggestion(i);
+            });
+            return item;
+        }));
+        quickAddSuggestions.style.display = suggestions.length ? 'block' : 'none';
+    }
+    function selectSuggestion(i) {
+        selectedSuggestion = (i + suggestions.length + 1) % (suggestions.length + 1) - 1;
+        Array.from(quickAddSuggestions.children).forEach(function(item, j) {
+            item.style.background = j == selectedSuggestion ? 'lightsteelblue' : '';
+        });
+    }
+    function acceptSuggestion(i) {
+        // the suggestion replaces the pattern being typed
+        quickAddPattern.value = quickAddPattern.value.replace(/[^\\s,;、，；]*$/, suggestions[i].key);
+        showSuggestions('[]');
+    }
+    quickAddPattern.addEventListener('input', function() {
+        const text = quickAddPattern.value;
+        edict.complete(text, function(result) {
+            // answers to previous keystrokes are dropped
+            if (quickAddPattern.value == text) {
+                showSuggestions(result);
+            }
+        });
+    });
+    // starts loading the dictionary and its completer in the background
+    // (the text area gets the focus before the channel is set up on Qt5)
+    quickAddPattern.addEventListener('focus', function() {
+        if (window.edict) {
+            edict.complete('', function() {});
+        }
+    });
+    quickAddPattern.addEventListener('blur', function() {
+        showSuggestions('[]');
+    });
+    quickAddPattern.addEventListener('keydown', function(event) {
+        if (!suggestions.length) {
+            return;
+        }
+        if (event.key == 'ArrowDown' || event.key == 'ArrowUp') {
+            event.preventDefault();
+            selectSuggestion(selectedSuggestion + (event.key == 'ArrowDown' ? 1 : -1));
+        } else if ((event.key == 'Enter' || event.key == 'Tab') && selectedSuggestion >= 0) {
+            event.preventDefault();
+            acceptSuggestion(selectedSuggestion);
+        } else if (event.key == 'Escape') {
+            showSuggestions('[]');
+        }
+    });
     quickAddPattern.addEventListener('keypress', function(event) {
-        if (event.keyCode == 13) {
+        // Shift+Enter inserts a new line
+        if (event.keyCode == 13 && !event.shiftKey) {
+            event.preventDefault();
             edict.quickAdd(quickAddPattern.value);
         }
     });
     </script>"""
 
 
+def on_profile_did_open() -> None:
+    from .collection import get_collection
+
+    # only start the HTTP API when it is enabled in the settings
+    if get_collection().conf.get('japanote_httpPort'):
+        from .api import start_api
+
+        start_api()
+
+
+def on_profile_will_close() -> None:
+    # nothing to stop if the API was never started
+    api = sys.modules.get(__name__ + '.api')
+    if api is not None:
+        api.stop_api()
+
+
 def main() -> None:
     assert mw is not None
 
@@ -80,5 +184,9 @@ def main() -> None:
     channel = web_page.webChannel()
     channel.registerObject('edict', bridge)
 
+    # local HTTP API
+    gui_hooks.profile_did_open.append(on_profile_did_open)
+    gui_hooks.profile_will_close.append(on_profile_will_close)
+
 
 main()
@@ -0,0 +1,59 @@
+from concurrent.futures import Future
+from typing import Optional
+
+from anki.errors import AnkiException
+from aqt import mw
+from aqt.utils import tooltip
+
+from .collection import get_collection
+from .edict2.httpapi import HttpApi, HttpError
+from .edict2.search import Word
+from .model import add_notes
+from .service import search_service
+
+api: Optional[HttpApi] = None
+# seconds a request waits for its notes to be added (on the main thread)
+add_timeout = 60
+
+
+def add_words(words: list[Word]) -> int:
+    """Add notes from a worker thread of the API"""
+    # the collection can only be modified from the main thread
+    assert mw is not None
+    future: Future[int] = Future()
+
+    def add() -> None:
+        try:
+            add_notes(words, future.set_result)
+        except (AnkiException, OSError, KeyError, ValueError) as e:
+            # others are shown by Anki, and the request times out
+            future.set_exception(e)
+
+    mw.taskman.run_on_main(add)
+    # the main thread may be waiting for the API to stop
+    try:
+        return future.result(add_timeout)
+    except AnkiException as e:
+        raise HttpError(500, f'cannot add the notes: {e}') from e
+
+
+def start_api() -> None:
+    """(Re)start the API on the port set in the configuration (0 to disable it)"""
+    global api
+    stop_api()
+    port = get_collection().conf.get('japanote_httpPort', 0)
+    if not port:
+        return
+    api = HttpApi(search_service.search_words, add_words, port=port)
+    try:
+        api.start()
+    except OSError as e:
+        api = None
+        tooltip(f'JapaNote: cannot listen on port {port} ({e.strerror})')
+
+
+def stop_api() -> None:
+    global api
+    if api is not None:
+        api.stop()
+        api = None
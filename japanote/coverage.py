@@ -0,0 +1,87 @@
+import html
+from collections.abc import Iterator
+
+from anki.collection import Collection
+from anki.utils import ids2str
+from aqt import mw
+from aqt.operations import QueryOp
+from aqt.utils import showInfo, showText
+
+from .edict2 import trace
+from .edict2.coverage import missing_words, scan_texts
+from .edict2.search import Word, parse_sequence_number
+
+# number of notes read (and scanned between progress updates) at once
+batch_size = 500
+# words listed in the report
+report_size = 500
+
+
+def scan_collection() -> None:
+    """Report the words used in the notes of the collection that have no JapaNote note yet"""
+    assert mw is not None
+    col = mw.col
+    assert col is not None
+    idfield = col.conf.get('japanote_idField')
+    if not idfield:
+        showInfo('Notes can only be compared with the collection when the JMdict ID is saved in a field')
+        return
+    model_name = col.conf.get('japanote_model')
+    model = col.models.by_name(model_name) if model_name else None
+    if model is None:
+        showInfo('Note type not found')
+        return
+    field_names = [field['name'] for field in model['flds']]
+    if idfield not in field_names:
+        showInfo(f'Note type "{model_name}" has no field "{idfield}"')
+        return
+
+    op = QueryOp(parent=mw, op=lambda col: find_missing_words(col, model['id'], field_names.index(idfield)),
+                 success=show_report)
+    op.with_progress('Scanning notes').run_in_background()
+
+
+def note_texts(col: Collection, note_ids: list[int]) -> Iterator[str]:
+    """Iterate through the text of notes (their fields on separate lines), reading them in batches"""
+    assert col.db is not None
+    for i in range(0, len(note_ids), batch_size):
+        for fields in col.db.list(f'select flds from notes where id in {ids2str(note_ids[i:i + batch_size])}'):
+            yield fields.replace('\x1f', '\n')
+
+
+def find_missing_words(col: Collection, model_id: int, idfield_index: int) -> list[tuple[Word, int]]:
+    """Count the words of the other notes that are not in a JapaNote note, in a background thread"""
+    assert mw is not None
+    assert col.db is not None
+    known: set[int] = set()
+    for fields in col.db.list('select flds from notes where mid = ?', model_id):
+        sequence_id = parse_sequence_number(fields.split('\x1f')[idfield_index])
+        if sequence_id is not None:
+            known.add(sequence_id)
+    note_ids = col.db.list('select id from notes where mid != ?', model_id)
+
+    def progress(n_notes: int) -> None:
+        label = f'Scanning notes ({n_notes}/{len(note_ids)})'
+        mw.taskman.run_on_main(lambda: mw.progress.update(label=label, value=n_notes, max=len(note_ids)))
+
+    # in this thread: the workers of a process pool would import the add-on, which needs Anki's GUI
+    with trace.span('scan collection'):
+        counts = scan_texts(note_texts(col, note_ids), progress=progress)
+    return missing_words(counts, known)
+
+
+def show_report(missing: list[tuple[Word, int]]) -> None:
+    if not missing:
+        showInfo('Every word found in the collection already has a note')
+        return
+    rows = ''.join(
+        f'<tr><td>{count}</td><td>{html.escape(word.kanji)}</td><td>{html.escape(word.kana)}</td>'
+        f'<td>{html.escape("; ".join(word.get_meanings()))}</td></tr>'
+        for word, count in missing[:report_size]
+    )
+    report = (
+        f'<p>{len(missing)} words of the collection have no note yet; the {min(len(missing), report_size)}'
+        f' most frequent ones:</p><table><tr><th>Count</th><th>Kanji</th><th>Kana</th><th>Definition</th></tr>'
+        f'{rows}</table>'
+    )
+    showText(report, type='html', title='JapaNote: missing words', copyBtn=True)
@@ -0,0 +1,156 @@
+"""Block-compressed files of text records with random access
+
+Run from the folder of the add-on:
+
+    python -m edict2.blocks edict2/edict2 edict2/enamdict
+    python -m edict2.blocks --text --encoding euc_jp edict2/kanjidic
+
+Records are grouped by block_records and each block is compressed with
+zlib on its own. An offset table locates the blocks, so that reading a
+record only decompresses its block:
+
+    magic, number of records, records per block, metadata size  (header)
+    offsets of the blocks, and of the end of the last one       (uint64)
+    zlib-compressed metadata                                    (bytes)
+    zlib-compressed blocks of records separated by '\\0'         (bytes)
+
+Dictionaries are stored one record per entry, with the derived data that is
+otherwise computed on load (see pack_dictionary); the metadata holds the
+keys of the entries. Other files (--text) are stored one line per record.
+"""
+import argparse
+import mmap
+import pickle
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+
+from .index import DictionaryIndex
+
+magic = b'JNBLK\x00\x00\x01'
+header_format = '<8sIIQ'
+header_size = struct.calcsize(header_format)
+
+
+def write_blocks(filename: str, records: Iterable[str], metadata: bytes = b'', block_records: int = 64) -> None:
+    """Write records (which must not contain '\\0') in blocks of block_records"""
+    blocks = []
+    block: list[str] = []
+    n_records = 0
+    for record in records:
+        block.append(record)
+        n_records += 1
+        if len(block) == block_records:
+            blocks.append(zlib.compress('\0'.join(block).encode(), 9))
+            block = []
+    if block:
+        blocks.append(zlib.compress('\0'.join(block).encode(), 9))
+
+    compressed_metadata = zlib.compress(metadata, 9)
+    offsets = array('Q', [0])
+    for data in blocks:
+        offsets.append(offsets[-1] + len(data))
+    with open(filename, 'wb') as f:
+        f.write(struct.pack(header_format, magic, n_records, block_records, len(compressed_metadata)))
+        f.write(offsets.tobytes())
+        f.write(compressed_metadata)
+        for data in blocks:
+            f.write(data)
+
+
+class BlockFile:
+    """Read-only access to the records of a file written by write_blocks"""
+    # number of decompressed blocks kept in memory
+    cache_size = 16
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.n_records: int
+        self.block_records: int
+        file_magic, self.n_records, self.block_records, metadata_size = struct.unpack_from(header_format, self.data)
+        if file_magic != magic:
+            msg = f'{filename} is not a block-compressed file'
+            raise ValueError(msg)
+        n_blocks = -(-self.n_records // self.block_records)
+        self.offsets = array('Q')
+        self.offsets.frombytes(self.data[header_size:header_size + 8 * (n_blocks + 1)])
+        self.metadata_start = header_size + 8 * (n_blocks + 1)
+        self.blocks_start = self.metadata_start + metadata_size
+        self.cache: OrderedDict[int, list[str]] = OrderedDict()
+        self.lock = threading.Lock()  # for the cache, when records are read from several threads
+
+    def __len__(self) -> int:
+        return self.n_records
+
+    def __getitem__(self, record_id: int) -> str:
+        if not 0 <= record_id < self.n_records:
+            raise IndexError(record_id)
+        block_id, i = divmod(record_id, self.block_records)
+        return self.block(block_id)[i]
+
+    def __iter__(self) -> Iterator[str]:
+        for block_id in range(len(self.offsets) - 1):
+            yield from self.read_block(block_id)
+
+    def metadata(self) -> bytes:
+        return zlib.decompress(self.data[self.metadata_start:self.blocks_start])
+
+    def block(self, block_id: int) -> list[str]:
+        with self.lock:
+            records = self.cache.get(block_id)
+            if records is not None:
+                self.cache.move_to_end(block_id)
+                return records
+        # decompressed without the lock; another thread may do the same meanwhile
+        records = self.read_block(block_id)
+        with self.lock:
+            self.cache[block_id] = records
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return records
+
+    def read_block(self, block_id: int) -> list[str]:
+        start = self.blocks_start + self.offsets[block_id]
+        end = self.blocks_start + self.offsets[block_id + 1]
+        return zlib.decompress(self.data[start:end]).decode().split('\0')
+
+    def close(self) -> None:
+        self.data.close()
+
+
+def pack_dictionary(index: DictionaryIndex, filename: str) -> None:
+    """Write a dictionary, one record per entry (line, type mask, furigana, facets and collation separated by tabs)"""
+    records = (
+        '\t'.join((entry[3].rstrip('\n'), str(type_), furigana, str(entry_facets), collation))
+        if entry is not None else ''
+        for entry, type_, furigana, entry_facets, collation in zip(
+            index.entries, index.types, index.furigana, index.facets, index.collation,
+        )
+    )
+    # the keys are loaded in memory, the entries are decoded on demand
+    keys = {key: ids[0] if len(ids) == 1 else ids for key, ids in index.keys.items()}
+    write_blocks(filename, records, pickle.dumps(keys, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def main() -> None:
+    from .build import build
+
+    parser = argparse.ArgumentParser(description='Write block-compressed copies (FILENAME.blk) of dictionary files')
+    parser.add_argument('filenames', nargs='+', help='files to compress')
+    parser.add_argument('--text', action='store_true', help='store lines as they are (default: EDICT2 dictionary)')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of text files (default: utf-8)')
+    args = parser.parse_args()
+    for filename in args.filenames:
+        if args.text:
+            with open(filename, encoding=args.encoding) as f:
+                write_blocks(filename + '.blk', f)
+        else:
+            pack_dictionary(build(filename), filename + '.blk')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Build the compiled index of a dictionary in EDICT2 format
+
+Run from the folder of the add-on:
+
+    python -m edict2.build edict2/edict2 -o edict2/edict2.idx --processes 4
+
+The source file is split into chunks on line boundaries, which are parsed in
+a process pool. Partial indexes are merged in the order of the chunks, so the
+result does not depend on the number of processes.
+"""
+import argparse
+import os
+import re
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from .index import DictionaryIndex, save_index
+from .search import Word, encode_collation, parse_line
+
+word_pattern = re.compile(r'[a-z]+')
+
+
+def chunk_ranges(filename: str, n_chunks: int) -> list[tuple[int, int]]:
+    """Split the file (without its header line) in byte ranges of whole lines"""
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        f.readline()  # skip header
+        boundaries = [f.tell()]
+        for i in range(1, n_chunks):
+            f.seek(max(size * i // n_chunks, boundaries[-1]))
+            f.readline()  # move to the start of the next line
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def index_words(words: Iterable[Word]) -> DictionaryIndex:
+    """Index words; entries are numbered from 0 in order"""
+    index = DictionaryIndex([], {}, [], [], {}, [], [])
+    for entry_id, word in enumerate(words):
+        index.entries.append((word.writings, word.readings, word.glosses, word.edict_entry))
+        for key in word.writings + word.readings:
+            index.keys.setdefault(key, []).append(entry_id)
+        index.types.append(word.get_type())
+        index.furigana.append(word.get_furigana())
+        index.facets.append(word.get_facets())
+        index.collation.append(encode_collation(word.get_collation()))
+        terms = set(word_pattern.findall(' '.join(word.get_meanings()).lower()))
+        for term in sorted(terms):
+            index.glosses.setdefault(term, []).append(entry_id)
+    return index
+
+
+def parse_chunk(filename: str, start: int, end: int) -> DictionaryIndex:
+    """Index the lines of the given byte range"""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode()
+    words = (parse_line(line) for line in data.splitlines(keepends=True))
+    return index_words(word for word in words if word is not None)
+
+
+def _parse_chunk(args: tuple[str, int, int]) -> DictionaryIndex:
+    return parse_chunk(*args)
+
+
+def merge(indexes: list[DictionaryIndex]) -> DictionaryIndex:
+    """Concatenate partial indexes, renumbering their entries"""
+    merged = DictionaryIndex([], {}, [], [], {}, [], [])
+    for index in indexes:
+        offset = len(merged.entries)
+        merged.entries.extend(index.entries)
+        merged.types.extend(index.types)
+        merged.furigana.extend(index.furigana)
+        merged.facets.extend(index.facets)
+        merged.collation.extend(index.collation)
+        for postings, partial in ((merged.keys, index.keys), (merged.glosses, index.glosses)):
+            for key, ids in partial.items():
+                postings.setdefault(key, []).extend(entry_id + offset for entry_id in ids)
+    return merged
+
+
+def build(filename: str, processes: Optional[int] = None) -> DictionaryIndex:
+    """Index a dictionary using the given number of processes (all cores by default)"""
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1:
+        return merge([parse_chunk(filename, start, end) for start, end in chunk_ranges(filename, 1)])
+    # more chunks than processes to balance the load
+    ranges = chunk_ranges(filename, processes * 4)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        indexes = list(executor.map(_parse_chunk, [(filename, start, end) for start, end in ranges]))
+    return merge(indexes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Build the compiled index of an EDICT2 dictionary')
+    parser.add_argument('filename', help='dictionary in EDICT2 format')
+    parser.add_argument('-o', '--output', help='index file (default: FILENAME.idx)')
+    parser.add_argument('-j', '--processes', type=int, help='number of processes (default: number of cores)')
+    args = parser.parse_args()
+    index = build(args.filename, args.processes)
+    save_index(index, args.output or args.filename + '.idx')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic, Optional, TypeVar
+
+from . import trace
+
+T = TypeVar('T')
+
+
+class QueryCache(Generic[T]):
+    """Least recently used cache of result lists, bounded by the total number of results
+
+    Entries are tagged with the version of the dictionaries they were computed
+    from; they are all dropped when the version changes.
+    """
+    def __init__(self, max_results: int = 20000) -> None:
+        self.max_results = max_results
+        self.entries: OrderedDict[Hashable, list[T]] = OrderedDict()
+        self.size = 0  # total number of results in entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # the HTTP API searches from worker threads
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def weight(results: list[T]) -> int:
+        # empty results still cost an entry
+        return len(results) + 1
+
+    def get(self, key: Hashable, version: int) -> Optional[list[T]]:
+        with self.lock:
+            if version > self.version:
+                self._clear(version)
+            # results of older dictionaries are never returned
+            results = self.entries.get(key) if version == self.version else None
+            if results is None:
+                self.misses += 1
+                trace.count('query cache misses')
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            trace.count('query cache hits')
+            return results
+
+    def put(self, key: Hashable, version: int, results: list[T]) -> None:
+        with self.lock:
+            if version < self.version:
+                return  # computed from dictionaries that have been replaced since
+            if version > self.version:
+                self._clear(version)
+            if self.weight(results) > self.max_results:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= self.weight(previous)
+            self.entries[key] = results
+            self.size += self.weight(results)
+            while self.size > self.max_results:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.weight(evicted)
+
+    def clear(self) -> None:
+        with self.lock:
+            self._clear(self.version)
+
+    def _clear(self, version: int) -> None:
+        self.entries.clear()
+        self.size = 0
+        self.version = version
@@ -0,0 +1,122 @@
+import getpass
+import json
+import os
+import socket
+import tempfile
+import threading
+from typing import Any, Optional
+
+from .deinflect import Candidate
+from .search import Word, parse_line
+
+
+def default_socket_path() -> str:
+    """Return the path of the socket in a folder only the user can access"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'japanote.sock')
+    # created by the daemon (see server.py)
+    return os.path.join(tempfile.gettempdir(), f'japanote-{getpass.getuser()}', 'lookup.sock')
+
+
+default_socket = default_socket_path()
+
+
+def is_private(path: str) -> bool:
+    """Whether path and its folder belong to the user and nobody else can access them"""
+    if not hasattr(os, 'getuid'):
+        return False
+    for name in (path, os.path.dirname(path)):
+        try:
+            stat = os.lstat(name)
+        except OSError:
+            return False
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            return False
+    return True
+
+
+def word_to_json(word: Word) -> dict[str, Any]:
+    return {
+        'line': word.edict_entry,
+        'type': word.get_type(),
+        'furigana': word.get_furigana(),
+        'facets': word.get_facets(),
+    }
+
+
+def word_from_json(data: dict[str, Any]) -> Word:
+    word = parse_line(data['line'])
+    assert word is not None
+    word._type = data['type']
+    word._furigana = data['furigana']
+    word._facets = data.get('facets')  # computed on demand with an older daemon
+    return word
+
+
+class LookupClient:
+    """Blocking connection to the lookup daemon (see server.py)"""
+    def __init__(self, path: str = default_socket) -> None:
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile('rwb')
+        self.lock = threading.Lock()
+        self.last_id = 0
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+    def call(self, method: str, **params: Any) -> Any:
+        with self.lock:
+            self.last_id += 1
+            request = {'id': self.last_id, 'method': method, 'params': params}
+            self.file.write(json.dumps(request).encode() + b'\n')
+            self.file.flush()
+            line = self.file.readline()
+        if not line:
+            msg = 'connection closed by the lookup daemon'
+            raise ConnectionError(msg)
+        response = json.loads(line)
+        if 'error' in response:
+            raise LookupError(response['error'])
+        return response['result']
+
+    def search(self, word: str, is_proper_noun: bool = False) -> list[Word]:
+        return [word_from_json(data) for data in self.call('search', word=word, is_proper_noun=is_proper_noun)]
+
+    def deinflect(self, word: str) -> list[Candidate]:
+        return [Candidate(*candidate) for candidate in self.call('deinflect', word=word)]
+
+    def furigana(self, kanji: str, kana: str) -> str:
+        result: str = self.call('furigana', kanji=kanji, kana=kana)
+        return result
+
+
+client: Optional[LookupClient] = None
+client_lock = threading.Lock()
+
+
+def get_client() -> Optional[LookupClient]:
+    """Return a connection to the lookup daemon (None when it is not running)"""
+    global client
+    with client_lock:
+        # a socket others could have made would let them answer the searches
+        if client is None and hasattr(socket, 'AF_UNIX') and is_private(default_socket):
+            try:
+                client = LookupClient()
+            except OSError:
+                return None
+        return client
+
+
+def close_client() -> None:
+    global client
+    with client_lock:
+        if client is not None:
+            client.close()
+            client = None
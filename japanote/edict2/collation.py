@@ -0,0 +1,57 @@
+import unicodedata
+from typing import NamedTuple
+
+# collation of kana in gojūon order, loosely following JIS X 4061: words are
+# first compared ignoring voicing marks, small kana, the long vowel mark and
+# the script; ties are broken by voicing and size (か < が < ぱ, ゃ < や), then by
+# script (hiragana before katakana)
+
+katakana_to_hiragana_table = {c: c - 0x60 for c in range(ord('ァ'), ord('ヶ') + 1)}
+small_to_large_table = str.maketrans('ぁぃぅぇぉっゃゅょゎゕゖ', 'あいうえおつやゆよわかけ')
+voicing_marks_table = dict.fromkeys([0x3099, 0x309A])  # combining (han)dakuten
+
+vowels = {
+    'あ': 'あかさたなはまやらわ',
+    'い': 'いきしちにひみりゐ',
+    'う': 'うくすつぬふむゆる',
+    'え': 'えけせてねへめれゑ',
+    'お': 'おこそとのほもよろを',
+}
+vowel_of = {kana: vowel for vowel, row in vowels.items() for kana in row}
+
+
+class CollationKey(NamedTuple):
+    primary: str
+    secondary: str
+    tertiary: str
+
+
+def expand_long_vowels(s: str) -> str:
+    """Replace each 'ー' with the vowel of the preceding kana"""
+    if 'ー' not in s:
+        return s
+    chars = list(s)
+    for i, c in enumerate(chars):
+        if c == 'ー' and i > 0:
+            previous = remove_voicing_marks(chars[i - 1]).translate(small_to_large_table)
+            chars[i] = vowel_of.get(previous, c)
+    return ''.join(chars)
+
+
+def remove_voicing_marks(s: str) -> str:
+    return unicodedata.normalize('NFD', s).translate(voicing_marks_table)
+
+
+def kana_key(s: str) -> CollationKey:
+    """Return a key sorting s in gojūon order (non-kana characters are kept as is)"""
+    secondary = expand_long_vowels(s.translate(katakana_to_hiragana_table))
+    primary = remove_voicing_marks(secondary).translate(small_to_large_table)
+    return CollationKey(primary, secondary, s)
+
+
+assert kana_key('か') < kana_key('が') < kana_key('き')
+assert kana_key('は') < kana_key('ば') < kana_key('ぱ') < kana_key('ひ')
+assert kana_key('しゃ') < kana_key('しや') < kana_key('しゆ')
+assert kana_key('あい') < kana_key('アイ') < kana_key('あう')
+assert kana_key('カード') < kana_key('かあどう')
+assert kana_key('じゅうす') < kana_key('ジュース') < kana_key('じゅえ')
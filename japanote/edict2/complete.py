@@ -0,0 +1,113 @@
+"""Ranked completion of the writings and readings of a dictionary
+
+Keys are ranked once (common words first, then shorter keys) and kept
+sorted, so that the keys starting with a prefix are a range found by
+bisection. The prefixes of more than threshold keys, which are the top
+nodes of a trie of the keys, keep their best k keys; the ranges of other
+prefixes are small enough to be ranked on demand. Completing any prefix,
+even a single character, therefore looks at most threshold keys.
+"""
+import bisect
+import heapq
+import threading
+from array import array
+from collections.abc import Iterable
+from typing import Optional
+
+from . import trace
+from .search import Edict, facets, get_edict, get_version
+
+# greater than any character, to find the end of the range of a prefix
+last_character = chr(0x10ffff)
+
+
+class Completer:
+    def __init__(self, ranked_keys: Iterable[str], k: int = 10, threshold: int = 256) -> None:
+        """Index keys given from the best to the worst"""
+        self.k = k
+        self.threshold = threshold
+        self.ranked_keys = list(dict.fromkeys(ranked_keys))
+        rank = {key: i for i, key in enumerate(self.ranked_keys)}
+        self.keys = sorted(self.ranked_keys)
+        # rank of each sorted key
+        self.ranks = array('I', [rank[key] for key in self.keys])
+        # prefix → best keys, for the prefixes of more than threshold keys
+        self.top: dict[str, list[str]] = {}
+        self._cache_top('', 0, len(self.keys))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _best(self, start: int, end: int) -> list[str]:
+        return [self.ranked_keys[rank] for rank in heapq.nsmallest(self.k, self.ranks[start:end])]
+
+    def _cache_top(self, prefix: str, start: int, end: int) -> None:
+        # iterative, since prefixes can be long (e.g. expressions)
+        stack = [(prefix, start, end)]
+        while stack:
+            prefix, start, end = stack.pop()
+            if end - start <= self.threshold:
+                continue
+            self.top[prefix] = self._best(start, end)
+            # the prefix itself comes first, then the keys grouped by their next character
+            i = start + (self.keys[start] == prefix)
+            while i < end:
+                child = self.keys[i][:len(prefix) + 1]
+                child_end = bisect.bisect_left(self.keys, child + last_character, i, end)
+                stack.append((child, i, child_end))
+                i = child_end
+
+    def complete(self, prefix: str) -> list[str]:
+        """Return the best keys (at most k) starting with prefix"""
+        top = self.top.get(prefix)
+        if top is not None:
+            return top
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + last_character, start)
+        return self._best(start, end)
+
+
+def rank_keys(edict: Edict) -> list[str]:
+    """Return the writings and readings of a dictionary, those of common words first, then the shorter ones"""
+    common: set[str] = set()
+    keys: set[str] = set()
+    for word in edict.entries():
+        word_keys = word.writings + word.readings
+        keys.update(word_keys)
+        if word.get_facets() & facets['common']:
+            common.update(word_keys)
+    return sorted(keys, key=lambda key: (key not in common, len(key), key))
+
+
+def build_completer(edict: Edict) -> Completer:
+    with trace.span('build_completer'):
+        return Completer(rank_keys(edict))
+
+
+# completer of EDICT, built in the background on first use
+completer: Optional[Completer] = None
+# version of the dictionaries it was built from (see search.get_version)
+completer_version = -1
+building: Optional[threading.Thread] = None
+
+
+def get_completer() -> Optional[Completer]:
+    """Return the completer of EDICT, or None while it is being built
+
+    The first call starts loading EDICT and building the completer in a
+    background thread; so does the first call after EDICT is replaced, the
+    previous completer being returned in the meantime.
+    """
+    global building
+    if completer_version == get_version() or (building is not None and building.is_alive()):
+        return completer
+
+    def build() -> None:
+        global completer, completer_version
+        version = get_version()
+        new_completer = build_completer(get_edict())
+        completer, completer_version = new_completer, version
+
+    building = threading.Thread(target=build, name='japanote-complete', daemon=True)
+    building.start()
+    return completer
@@ -0,0 +1,201 @@
+"""Words of the dictionary used in texts, e.g. the fields of a collection
+
+Run from the folder of the add-on, with notes exported as plain text:
+
+    python -m edict2.coverage notes.txt --known known.txt -j 4
+
+Texts are split into runs of Japanese characters, which are scanned from
+left to right: at each position, the longest string that is a word of
+EDICT, possibly inflected (see lookup.py), is taken and the scan goes on
+after it. Only strings made of the beginning of a key, followed by hiragana
+for an inflection, are looked up. Single kana (mostly particles) are skipped. When a string has
+several entries, the common ones are preferred.
+
+Texts are scanned in chunks, in a process pool when there are several
+processes; each process loads its own copy of the dictionary.
+"""
+import argparse
+import bisect
+import os
+import re
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from .lookup import lookup
+from .search import Edict, Word, facets, get_edict, kanji_pattern, parse_sequence_number
+
+japanese_pattern = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々〆]+')
+hiragana_pattern = re.compile(r'[\u3041-\u309f]+')
+# markup of Anki fields: HTML tags and entities, furigana in brackets, sounds
+markup_pattern = re.compile(r'<[^>]*>|&[a-z]+;|&#[0-9]+;|\[[^\]]*\]')
+# longest string looked up at each position
+max_length = 10
+# texts scanned between progress updates
+chunk_size = 500
+
+
+class Scanner:
+    def __init__(self, edict: Optional[Edict] = None, max_length: int = max_length, cache_size: int = 1 << 16) -> None:
+        """Scan texts for the words of a dictionary (EDICT by default)"""
+        if edict is None:
+            edict = get_edict()
+        self.max_length = max_length
+        # only strings starting like a key can be words, possibly inflected
+        self.keys = sorted({key for word in edict.entries() for key in word.writings + word.readings})
+        # string → sequence numbers of its entries (empty if not a word)
+        self.cache: dict[str, tuple[int, ...]] = {}
+        self.cache_size = cache_size
+
+    def is_prefix(self, string: str) -> bool:
+        """Whether some key starts with string"""
+        i = bisect.bisect_left(self.keys, string)
+        return i < len(self.keys) and self.keys[i].startswith(string)
+
+    def entries(self, string: str) -> tuple[int, ...]:
+        """Return the sequence numbers of the entries of a string (common entries if any)"""
+        try:
+            return self.cache[string]
+        except KeyError:
+            pass
+        words = list(lookup(string))
+        common = [word for word in words if word.get_facets() & facets['common']]
+        entries = tuple(dict.fromkeys(word.get_sequence_id() for word in common or words))
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()  # texts of a collection share most of their words
+        self.cache[string] = entries
+        return entries
+
+    def match(self, run: str, start: int) -> tuple[int, tuple[int, ...]]:
+        """Return the length and the entries of the longest word at start of run (1 and none if there is no word)"""
+        end = min(start + self.max_length, len(run))
+        # longest prefix of a key, which can be followed by the kana of an inflection
+        stem_end = start
+        while stem_end < end and self.is_prefix(run[start:stem_end + 1]):
+            stem_end += 1
+        if stem_end == start:
+            return 1, ()
+        inflection = hiragana_pattern.match(run, stem_end, end)
+        for length in range((inflection.end() if inflection else stem_end) - start, 0, -1):
+            string = run[start:start + length]
+            if length == 1 and not kanji_pattern.match(string):
+                break  # particles and other single kana
+            entries = self.entries(string)
+            if entries:
+                return length, entries
+        return 1, ()
+
+    def scan(self, text: str) -> Iterator[int]:
+        """Iterate through the sequence numbers of the words of text"""
+        for run in japanese_pattern.findall(markup_pattern.sub(' ', text)):
+            i = 0
+            while i < len(run):
+                length, entries = self.match(run, i)
+                yield from entries
+                i += length
+
+
+def count_words(texts: Iterable[str], scanner: Optional[Scanner] = None) -> Counter[int]:
+    """Count the words of texts by sequence number"""
+    if scanner is None:
+        scanner = Scanner()
+    counts: Counter[int] = Counter()
+    for text in texts:
+        counts.update(scanner.scan(text))
+    return counts
+
+
+# scanner of a worker process, kept between chunks
+worker_scanner: Optional[Scanner] = None
+
+
+def _count_chunk(texts: list[str]) -> Counter[int]:
+    global worker_scanner
+    if worker_scanner is None:
+        worker_scanner = Scanner()
+    return count_words(texts, worker_scanner)
+
+
+def chunks(texts: Iterable[str], size: int) -> Iterator[list[str]]:
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_texts(
+    texts: Iterable[str], processes: int = 1, progress: Optional[Callable[[int], None]] = None,
+) -> Counter[int]:
+    """Count the words of texts, calling progress with the number of texts scanned after each chunk"""
+    counts: Counter[int] = Counter()
+    n_texts = 0
+    if processes == 1:
+        scanner = Scanner()
+        for chunk in chunks(texts, chunk_size):
+            counts.update(count_words(chunk, scanner))
+            n_texts += len(chunk)
+            if progress is not None:
+                progress(n_texts)
+        return counts
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # a few chunks ahead of the workers, so that texts are read as they are scanned
+        pending = []
+        for chunk in chunks(texts, chunk_size):
+            pending.append((len(chunk), executor.submit(_count_chunk, chunk)))
+            while len(pending) > 2 * processes:
+                size, future = pending.pop(0)
+                counts.update(future.result())
+                n_texts += size
+                if progress is not None:
+                    progress(n_texts)
+        for size, future in pending:
+            counts.update(future.result())
+            n_texts += size
+            if progress is not None:
+                progress(n_texts)
+    return counts
+
+
+def missing_words(counts: Counter[int], known: Iterable[int]) -> list[tuple[Word, int]]:
+    """Return the words counted that are not known (e.g. have a note), the most frequent first"""
+    known = set(known)
+    edict = get_edict()
+    missing = []
+    for sequence_id, count in counts.most_common():
+        if sequence_id in known:
+            continue
+        word = edict.get_by_sequence_id(sequence_id)
+        if word is not None:
+            missing.append((word, count))
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='List the words of texts that are not known yet')
+    parser.add_argument('filenames', nargs='+', help='text files, one text per line')
+    parser.add_argument('--known', help='file of the JMdict IDs (e.g. EntL1358280X) of known words, one per line')
+    parser.add_argument('-j', '--processes', type=int, help='number of processes (default: number of cores)')
+    parser.add_argument('-n', '--number', type=int, default=100, help='number of words listed (default: 100)')
+    args = parser.parse_args()
+
+    def texts() -> Iterator[str]:
+        for filename in args.filenames:
+            with open(filename, encoding='utf-8') as f:
+                yield from f
+
+    known: list[int] = []
+    if args.known:
+        with open(args.known, encoding='utf-8') as f:
+            known = [sequence_id for sequence_id in map(parse_sequence_number, f.read().split()) if sequence_id]
+    counts = scan_texts(texts(), args.processes or os.cpu_count() or 1)
+    for word, count in missing_words(counts, known)[:args.number]:
+        print(f'{count}\t{word.kanji}\t{word.kana}\t{word.get_sequence_number()}\t{"; ".join(word.get_meanings())}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os.path
-from typing import Iterator, NamedTuple, Tuple
+from collections.abc import Iterator
+from typing import NamedTuple, Tuple
 
 default_deinflect = os.path.join(os.path.dirname(__file__), 'deinflect.dat')
 
@@ -43,6 +44,7 @@ class Deinflector:
     def __init__(self, deinflect_data_filename: str = default_deinflect):
         """Populate deinflecting rules from given file"""
         self.suffix_to_rules: SuffixToRules = {}
+        self.rules: list[Rule] = []  # in the order of the file
         with open(deinflect_data_filename, 'rb') as f:
             lines = iter(f)
             next(lines)  # skip header
@@ -72,7 +74,9 @@ class Deinflector:
                             suffix_to_rules[c] = (rules, new_suffix_to_rules)
                             suffix_to_rules = new_suffix_to_rules
                     assert rules is not None
-                    rules.append(Rule(from_, to, type_, reason))
+                    rule = Rule(from_, to, type_, reason)
+                    rules.append(rule)
+                    self.rules.append(rule)
 
     def __call__(self, word: str) -> Iterator[Candidate]:
         """Iterate through possible deinflections of word (including word)
@@ -0,0 +1,163 @@
+"""Example sentences of the Tanaka corpus, indexed by the words they contain
+
+Run from the folder of the add-on, with the corpus saved as edict2/examples.utf:
+
+    python -m edict2.examples edict2/examples.utf
+
+The corpus (also distributed by Tatoeba in this format) pairs each sentence
+with the dictionary forms of its words:
+
+    A: 何かお飲み物はいかがですか。	Would you like something to drink?#ID=4851_1426
+    B: 何か 御{お} 飲み物 は 如何[01]{いかが} です か
+
+Words of B lines can have a reading in parentheses, a sense number in
+brackets, the form used in the sentence in braces and a final ~ for
+sentences that are good examples of them. The sentences are written
+block-compressed (FILENAME.blk, see blocks.py) while the corpus is read,
+and the words are written to a key index (FILENAME.keys, see keyindex.py)
+whose postings are the numbers of their sentences, good examples first.
+Words with a reading are indexed as 'word(reading)'. At most max_examples
+sentences are kept per word, so memory does not grow with the corpus.
+"""
+import argparse
+import contextlib
+import os
+import re
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple, Optional
+
+from .blocks import BlockFile, write_blocks
+from .keyindex import KeyIndex, write_key_index
+from .search import Word, is_up_to_date
+
+default_examples = os.path.join(os.path.dirname(__file__), 'examples')
+# sentences kept per word
+max_examples = 10
+
+example_word_pattern = re.compile(r'^([^(\[{~]+)(?:\(([^)]*)\))?(?:\[[0-9]+\])?(?:\{[^}]*\})?(~)?$')
+
+
+class Example(NamedTuple):
+    japanese: str
+    english: str
+
+
+class ExampleWord(NamedTuple):
+    key: str  # 'word' or 'word(reading)'
+    is_good: bool  # marked with ~
+
+
+def parse_example_words(line: str) -> list[ExampleWord]:
+    """Parse the words of a B line (without 'B: ')"""
+    words = []
+    for token in line.split():
+        match = example_word_pattern.match(token)
+        if match is None:
+            continue
+        word, reading, good = match.groups()
+        words.append(ExampleWord(f'{word}({reading})' if reading else word, bool(good)))
+    return words
+
+
+def iter_examples(lines: Iterable[str]) -> Iterator[tuple[Example, list[ExampleWord]]]:
+    """Iterate through the sentences of a corpus with their words"""
+    example = None
+    for line in lines:
+        if line.startswith('A: '):
+            japanese, _, english = line[3:].rstrip('\n').partition('\t')
+            example = Example(japanese, english.split('#ID=', 1)[0])
+        elif line.startswith('B: ') and example is not None:
+            yield example, parse_example_words(line[3:])
+            example = None
+
+
+def build_examples(lines: Iterable[str], filename: str, max_examples: int = max_examples) -> int:
+    """Write the sentences of a corpus (FILENAME.blk) and their index (FILENAME.keys); return their number"""
+    # key → (is not good, number of the sentence)
+    postings: dict[str, list[tuple[bool, int]]] = {}
+    n_examples = 0
+
+    def records() -> Iterator[str]:
+        nonlocal n_examples
+        for example, words in iter_examples(lines):
+            example_id = n_examples
+            n_examples += 1
+            for key, is_good in dict.fromkeys(words):
+                sentences = postings.setdefault(key, [])
+                if len(sentences) < max_examples:
+                    sentences.append((not is_good, example_id))
+                elif is_good:
+                    # a good example replaces the last other one
+                    for i in reversed(range(len(sentences))):
+                        if sentences[i][0]:
+                            sentences[i] = (False, example_id)
+                            break
+            yield f'{example.japanese}\t{example.english}'.replace('\0', '')
+
+    write_blocks(filename + '.blk', records())
+    keys = {key: [example_id for _, example_id in sorted(sentences)] for key, sentences in postings.items()}
+    write_key_index(keys, n_examples, filename + '.keys')
+    return n_examples
+
+
+class Examples:
+    """Read-only access to the files written by build_examples
+
+    Raises ValueError for files written by another version of the add-on.
+    """
+    def __init__(self, filename: str) -> None:
+        self.sentences = BlockFile(filename + '.blk')
+        self.keys = KeyIndex(filename + '.keys')
+        if self.keys.n_entries != len(self.sentences):
+            msg = f'{filename}.keys was not written for {filename}.blk'
+            raise ValueError(msg)
+
+    def __len__(self) -> int:
+        return len(self.sentences)
+
+    def get(self, key: str) -> list[Example]:
+        """Return the sentences of a word ('word' or 'word(reading)')"""
+        return [Example(*self.sentences[example_id].split('\t', 1)) for example_id in self.keys.get(key)]
+
+    def for_word(self, word: Word, limit: int = max_examples) -> list[Example]:
+        """Return the sentences of an entry, those of its readings first"""
+        keys = [f'{writing}({reading})' for writing in word.writings for reading in word.readings] + word.writings
+        example_ids: dict[int, None] = {}
+        for key in keys:
+            example_ids.update(dict.fromkeys(self.keys.get(key)))
+            if len(example_ids) >= limit:
+                break
+        return [Example(*self.sentences[example_id].split('\t', 1)) for example_id in list(example_ids)[:limit]]
+
+
+# sentences of the default corpus, looked for on first use (None if not built)
+examples: Optional[Examples] = None
+looked_for_examples = False
+
+
+def get_examples() -> Optional[Examples]:
+    global examples, looked_for_examples
+    if not looked_for_examples:
+        looked_for_examples = True
+        if is_up_to_date(default_examples + '.keys', default_examples + '.blk'):
+            # ValueError when written by another version
+            with contextlib.suppress(ValueError):
+                examples = Examples(default_examples)
+    return examples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Index the example sentences of a corpus in Tanaka format')
+    parser.add_argument('filename', help='corpus, e.g. edict2/examples.utf')
+    parser.add_argument('-o', '--output', help='base name of the files written (default: FILENAME without extension)')
+    parser.add_argument('--max-examples', type=int, default=max_examples,
+                        help=f'maximum number of sentences per word (default: {max_examples})')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.filename)[0]
+    with open(args.filename, encoding='utf-8') as f:
+        n_examples = build_examples(f, output, args.max_examples)
+    print(f'{output}.blk: {n_examples} sentences, {len(KeyIndex(output + ".keys"))} words')
+
+
+if __name__ == '__main__':
+    main()
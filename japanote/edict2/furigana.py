@@ -1,9 +1,23 @@
+import threading
 from collections import deque
-from typing import Iterator, Optional
+from collections.abc import Iterator
+from typing import Optional
 
-from .kanji import load_kanjidic
+from . import trace
+from .kanji import Kanji, load_kanjidic
 
-kanjidic = None
+kanjidic: Optional[dict[str, Kanji]] = None
+kanjidic_lock = threading.Lock()
+
+
+def get_kanjidic() -> dict[str, Kanji]:
+    global kanjidic
+    if kanjidic is None:
+        with kanjidic_lock:
+            if kanjidic is None:
+                with trace.span('load_kanjidic'):
+                    kanjidic = load_kanjidic()
+    return kanjidic
 
 
 def lengthen_vowel(s: str) -> Optional[str]:
@@ -28,9 +42,7 @@ def match_from_kanji_kana(kanji: str, kana: str) -> Iterator[list[tuple[str, str
     based on their known readings. For instance, for '牛肉' and 'ぎゅうにく',
     it yields the single match [('牛', 'ぎゅう'), ('肉', 'にく')].
     """
-    global kanjidic
-    if kanjidic is None:
-        kanjidic = load_kanjidic()
+    kanjidic = get_kanjidic()
 
     default = [(kanji, kana)]
     q = deque([([], kanji, kana)])
@@ -89,11 +101,16 @@ def furigana_from_match(match: list[tuple[str, str]]) -> str:
     return ''.join(_())
 
 
-assert furigana_from_kanji_kana('私', 'わたし') == '私[わたし]'
-assert furigana_from_kanji_kana('牛肉', 'ぎゅうにく') == '牛[ぎゅう]肉[にく]'
-assert furigana_from_kanji_kana('一二三四五六七八九十', 'いちにさんしごろくななはちきゅうじゅう') == '一[いち]二[に]三[さん]四[し]五[ご]六[ろく]七[なな]八[はち]九[きゅう]十[じゅう]'
-assert furigana_from_kanji_kana('等々', 'などなど') == '等[など]々[など]'
-assert furigana_from_kanji_kana('日帰り', 'ひがえり') == '日[ひ]帰[がえ]り'
-assert furigana_from_kanji_kana('判官', 'はんがん') == '判[はん]官[がん]'
-assert furigana_from_kanji_kana('贔屓', 'ひいき') == '贔[ひい]屓[き]'
-assert furigana_from_kanji_kana('判官贔屓', 'はんがんびいき') == '判[はん]官[がん]贔[びい]屓[き]'
+# self-checks; run with `python -m edict2.furigana` from the add-on folder
+# (not at import time since they load kanjidic)
+if __name__ == '__main__':
+    assert furigana_from_kanji_kana('私', 'わたし') == '私[わたし]'
+    assert furigana_from_kanji_kana('牛肉', 'ぎゅうにく') == '牛[ぎゅう]肉[にく]'
+    assert furigana_from_kanji_kana('一二三四五六七八九十', 'いちにさんしごろくななはちきゅうじゅう') == (
+        '一[いち]二[に]三[さん]四[し]五[ご]六[ろく]七[なな]八[はち]九[きゅう]十[じゅう]'
+    )
+    assert furigana_from_kanji_kana('等々', 'などなど') == '等[など]々[など]'
+    assert furigana_from_kanji_kana('日帰り', 'ひがえり') == '日[ひ]帰[がえ]り'
+    assert furigana_from_kanji_kana('判官', 'はんがん') == '判[はん]官[がん]'
+    assert furigana_from_kanji_kana('贔屓', 'ひいき') == '贔[ひい]屓[き]'
+    assert furigana_from_kanji_kana('判官贔屓', 'はんがんびいき') == '判[はん]官[がん]贔[びい]屓[き]'
@@ -0,0 +1,310 @@
+"""Local HTTP API for dictionary lookups from browser extensions and other tools
+
+The server only listens on the loopback interface. Requests and responses are
+JSON:
+
+    GET /search?q=taberu[&proper_noun=1]
+    {"words": [{"kanji": "食べる", "kana": "たべる", "furigana": "食[た]べる", ...}]}
+
+    POST /search {"queries": ["taberu", "nomu"], "proper_noun": false}
+    {"results": [{"words": [...]}, {"words": [...]}]}
+
+    POST /notes {"words": ["anki", {"pattern": "taberu", "id": "EntL1358280X"}]}
+    {"added": 2, "not_found": [], "ambiguous": []}
+
+A word is only added when its pattern matches a single entry, or when the
+JMdict ID of the entry is given. POST requests must be sent as
+application/json: browsers do not allow web pages to send such requests to
+another origin without a preflight, which this server never accepts.
+
+Connections are kept alive between requests. The queries of a request are
+looked up together in a bounded pool of worker threads, so that neither the
+event loop nor Anki's main thread ever wait for the dictionaries; requests
+beyond max_pending are rejected with 503.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import threading
+from typing import Any, Callable, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+from .search import Word
+
+Search = Callable[[str, bool], list[Word]]
+AddWords = Callable[[list[Word]], int]
+
+reasons = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    415: 'Unsupported Media Type',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+# seconds stop() waits for the connections to close
+stop_timeout = 5
+# the Host header must name the loopback interface (protects against DNS rebinding)
+local_hosts = {'127.0.0.1', 'localhost', '[::1]'}
+# before Python 3.11 (Anki 24.06 ships 3.9), asyncio and concurrent.futures have their own TimeoutError
+timeout_errors = (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def word_to_json(word: Word) -> dict[str, Any]:
+    return {
+        'kanji': word.kanji,
+        'kana': word.kana,
+        'furigana': word.get_furigana(),
+        'id': word.get_sequence_number(),  # null for names of ENAMDICT
+        'meanings': word.get_meanings(),
+        'common': word.is_common(),
+    }
+
+
+def parse_bool(value: Union[str, bool, int]) -> bool:
+    if not isinstance(value, str):
+        return bool(value)
+    return value.lower() in ('1', 'true', 'yes')
+
+
+class HttpApi:
+    # bytes of the largest request body accepted
+    max_body = 2**20
+    # seconds a connection is kept open without a request
+    idle_timeout: float = 30
+
+    def __init__(
+        self,
+        search: Search,
+        add_words: Optional[AddWords] = None,
+        port: int = 0,
+        workers: int = 2,
+        max_pending: int = 64,
+    ) -> None:
+        """Serve search (and add_words, if given) on port (0 for any free port)"""
+        self.search = search
+        self.add_words = add_words
+        self.port = port
+        self.max_pending = max_pending
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='japanote-http')
+        self.pending = 0  # only accessed from the event loop
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.thread: Optional[threading.Thread] = None
+        self.connections: dict[asyncio.StreamWriter, asyncio.Task[None]] = {}
+
+    def start(self) -> int:
+        """Start serving in a background thread and return the port"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='japanote-http', daemon=True)
+        self.thread.start()
+        start_server = asyncio.start_server(self.handle_connection, '127.0.0.1', self.port)
+        try:
+            self.server = asyncio.run_coroutine_threadsafe(start_server, self.loop).result()
+        except OSError:
+            self.stop()
+            raise
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    def stop(self) -> None:
+        if self.loop is None or self.thread is None:
+            return
+        # the caller may be the thread a request waits for (e.g. Anki's main thread adding notes)
+        with contextlib.suppress(concurrent.futures.TimeoutError):
+            asyncio.run_coroutine_threadsafe(self.close_connections(), self.loop).result(stop_timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(stop_timeout)
+        if not self.thread.is_alive():
+            self.loop.close()
+        self.executor.shutdown(wait=False)
+        self.loop = self.server = self.thread = None
+
+    async def close_connections(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        # handlers waiting for a worker are cancelled rather than waited for
+        tasks = list(self.connections.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self.connections[writer] = task
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except timeout_errors:
+                    break
+                if not request_line:
+                    break
+                try:
+                    status, result, keep_alive = await self.handle_request(request_line, reader)
+                except HttpError as e:
+                    status, result, keep_alive = e.status, {'error': str(e)}, False
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, *timeout_errors):
+                    raise
+                except (KeyError, ValueError) as e:
+                    # e.g. a header line longer than the limit of the reader
+                    status, result, keep_alive = 400, {'error': str(e)}, False
+                body = json.dumps(result, ensure_ascii=False).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} {reasons[status]}\r\n'
+                    'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                    '\r\n'.encode() + body,
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # client went away or sent garbage
+        except timeout_errors:
+            pass  # client stopped in the middle of a request
+        except asyncio.CancelledError:
+            pass  # server stopping (see close_connections)
+        finally:
+            del self.connections[writer]
+            writer.close()
+
+    async def handle_request(self, request_line: bytes, reader: asyncio.StreamReader) -> tuple[int, Any, bool]:
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, 'malformed request line') from None
+
+        headers = await self.read_headers(reader)
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        body = None
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HttpError(400, 'invalid Content-Length') from None
+        if length > self.max_body:
+            raise HttpError(413, 'request body too large')
+        if length:
+            body = await reader.readexactly(length)
+
+        host = headers.get('host', '').rsplit(':', 1)[0]
+        if host not in local_hosts:
+            raise HttpError(403, 'only local requests are accepted')
+
+        url = urlsplit(target)
+        data = self.get_data(method, url.query, headers, body)
+        if url.path == '/search':
+            results = await self.run(self.search_batch, self.get_queries(method, data), self.get_proper_noun(data))
+            result = results[0] if method == 'GET' else {'results': results}
+        elif url.path == '/notes' and method == 'POST' and self.add_words is not None:
+            result = await self.run(self.add_batch, self.get_words(data), self.get_proper_noun(data))
+        else:
+            raise HttpError(404, f'no such endpoint {method} {url.path}')
+        return 200, result, keep_alive
+
+    async def read_headers(self, reader: asyncio.StreamReader) -> dict[str, str]:
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    def get_data(method: str, query: str, headers: dict[str, str], body: Optional[bytes]) -> dict[str, Any]:
+        """Return the parameters of a request: its JSON object (POST) or its query string (GET)"""
+        if method == 'POST':
+            if headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+                raise HttpError(415, 'expected application/json')
+            try:
+                data = json.loads(body or b'')
+            except ValueError:
+                raise HttpError(400, 'invalid JSON') from None
+            if not isinstance(data, dict):
+                raise HttpError(400, 'expected a JSON object')
+            return data
+        if method == 'GET':
+            return {name: values[-1] for name, values in parse_qs(query).items()}
+        raise HttpError(405, f'unsupported method {method}')
+
+    @staticmethod
+    def get_queries(method: str, data: dict[str, Any]) -> list[str]:
+        queries = [data.get('q')] if method == 'GET' else data.get('queries')
+        if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+            raise HttpError(400, 'expected q parameter or list of queries')
+        return queries
+
+    @staticmethod
+    def get_words(data: dict[str, Any]) -> list[tuple[str, Optional[str]]]:
+        words = data.get('words')
+        if not isinstance(words, list):
+            raise HttpError(400, 'expected list of words')
+        patterns: list[tuple[str, Optional[str]]] = []
+        for word in words:
+            if isinstance(word, str):
+                patterns.append((word, None))
+            elif isinstance(word, dict) and isinstance(word.get('pattern'), str):
+                patterns.append((word['pattern'], word.get('id')))
+            else:
+                raise HttpError(400, 'expected pattern or {"pattern": ..., "id": ...}')
+        return patterns
+
+    @staticmethod
+    def get_proper_noun(data: dict[str, Any]) -> bool:
+        return parse_bool(data.get('proper_noun', False))
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run function in the worker pool, unless too many requests are waiting"""
+        if self.pending >= self.max_pending:
+            raise HttpError(503, 'too many pending requests')
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        except HttpError:
+            raise
+        except (OSError, KeyError, ValueError, *timeout_errors) as e:
+            # e.g. a dictionary that cannot be read, or notes not added in time: not a timeout of the client
+            raise HttpError(500, f'internal error: {e!r}') from e
+        finally:
+            self.pending -= 1
+
+    def search_batch(self, queries: list[str], is_proper_noun: bool) -> list[dict[str, Any]]:
+        # identical queries of a batch are only looked up once
+        results: dict[str, dict[str, Any]] = {}
+        for query in queries:
+            if query not in results:
+                results[query] = {'words': [word_to_json(word) for word in self.search(query, is_proper_noun)]}
+        return [results[query] for query in queries]
+
+    def add_batch(self, patterns: list[tuple[str, Optional[str]]], is_proper_noun: bool) -> dict[str, Any]:
+        assert self.add_words is not None
+        words = []
+        not_found = []
+        ambiguous = []
+        for pattern, sequence_number in patterns:
+            candidates = self.search(pattern, is_proper_noun)
+            if sequence_number is not None:
+                candidates = [word for word in candidates if word.get_sequence_number() == sequence_number]
+            if not candidates:
+                not_found.append(pattern)
+            elif len(candidates) > 1:
+                ambiguous.append(pattern)
+            else:
+                words.append(candidates[0])
+        added = self.add_words(words) if words else 0
+        return {'added': added, 'not_found': not_found, 'ambiguous': ambiguous}
@@ -0,0 +1,47 @@
+import pickle
+from typing import NamedTuple, Optional
+
+# bump when the layout of DictionaryIndex changes, or how its values are computed
+index_version = 6
+
+
+# NOTE: only builtin types are stored, so that indexes can be loaded whatever
+# the name of the package (the folder of the add-on)
+class DictionaryIndex(NamedTuple):
+    """Compiled form of a dictionary; entries are referred to by their position"""
+    # writings, readings, glosses, line (None for entries removed by update.py)
+    entries: list[Optional[tuple[list[str], list[str], str, str]]]
+    keys: dict[str, list[int]]  # writing or reading → entries
+    types: list[int]  # type masks for deinflections
+    furigana: list[str]
+    glosses: dict[str, list[int]]  # lowercase English word → entries
+    facets: list[int]  # masks of facets, for filtering results
+    collation: list[str]  # sort keys of the search window (see encode_collation)
+
+    def search_gloss(self, term: str) -> list[int]:
+        return self.glosses.get(term.lower(), [])
+
+
+def save_index(index: DictionaryIndex, filename: str) -> None:
+    # the keys are saved last, so that they can be skipped (see load_index)
+    with open(filename, 'wb') as f:
+        pickle.dump(index_version, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(
+            (index.entries, index.types, index.furigana, index.facets, index.collation), f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        pickle.dump((index.keys, index.glosses), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_index(filename: str, with_keys: bool = True) -> Optional[DictionaryIndex]:
+    """Load an index saved by save_index (None if it was built by another version)
+
+    Without keys, the keys and glosses of the index are left empty, e.g. for
+    a dictionary that looks up its keys in a key index (see keyindex.py).
+    """
+    with open(filename, 'rb') as f:
+        if pickle.load(f) != index_version:
+            return None
+        entries, types, furigana, facets, collation = pickle.load(f)
+        keys, glosses = pickle.load(f) if with_keys else ({}, {})
+    return DictionaryIndex(entries, keys, types, furigana, glosses, facets, collation)
@@ -0,0 +1,188 @@
+"""Index of the inflected forms of the words of a dictionary
+
+Run from the folder of the add-on:
+
+    python -m edict2.inflections edict2/edict2 --depth 2
+
+The deinflection rules are applied backwards to the verbs and adjectives of
+the dictionary, so that looking up an inflected form gives the candidates
+Deinflector would find by removing its suffixes, restricted to those in the
+dictionary. Forms needing more than depth rules are left out, and lookup()
+deinflects them. A form of the index is also given the candidates that
+Deinflector finds for it with more rules (with no reasons), so that its
+inflections are complete and lookup() does not deinflect it. The index is
+not used once the compiled index of the dictionary is updated (see
+update.py), since it would miss the new entries.
+
+The index is a key index (see keyindex.py) whose postings are two uint32 per
+inflection:
+
+    characters to remove from the form << 16 | number of the ending
+    type mask of the dictionary form << 16 | number of the reasons
+
+The endings and the chains of reasons are stored in the metadata.
+"""
+import argparse
+import contextlib
+import os
+import pickle
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple, Optional
+
+from .deinflect import Deinflector, Rule
+from .index import DictionaryIndex
+from .keyindex import KeyIndex, write_key_index
+from .search import default_edict, is_up_to_date
+
+default_inflections = default_edict + '.inf'
+default_index = default_edict + '.idx'
+# endings and chains of reasons are numbered on 16 bits
+max_numbers = 0x10000
+
+
+class Inflection(NamedTuple):
+    word: str  # dictionary form
+    type_: int  # mask of grammatical classes, like Candidate.type_
+    reasons: tuple[str, ...]  # in the order the suffixes are removed; empty beyond the depth of the index
+
+
+def group_rules(rules: Iterable[Rule]) -> dict[str, list[Rule]]:
+    """Group rules by the ending they give back"""
+    rules_by_ending: dict[str, list[Rule]] = {}
+    for rule in rules:
+        rules_by_ending.setdefault(rule.to, []).append(rule)
+    return rules_by_ending
+
+
+def inflect(
+    word: str, type_: int, rules_by_ending: dict[str, list[Rule]], max_depth: int = 2,
+) -> Iterator[tuple[str, Inflection]]:
+    """Iterate through the forms that deinflect to word (of the given type) with at most max_depth rules"""
+    # breadth first, so that shorter chains of reasons come first
+    queue: deque[tuple[str, int, int, tuple[str, ...]]] = deque([(word, type_, 0, ())])
+    while queue:
+        form, required_type, word_type, reasons = queue.popleft()
+        for start in range(len(form) + 1):
+            for rule in rules_by_ending.get(form[start:], ()):
+                # deinflecting with this rule must give a type that is still accepted
+                if not (rule.type_ >> 8) & required_type:
+                    continue
+                inflected = form[:start] + rule.from_
+                inflection = Inflection(word, word_type or rule.type_ >> 8, (rule.reason, *reasons))
+                yield inflected, inflection
+                if len(inflection.reasons) < max_depth:
+                    queue.append((inflected, rule.type_ & 0xff, inflection.type_, inflection.reasons))
+
+
+def build_inflections(
+    index: DictionaryIndex, deinflector: Deinflector, max_depth: int = 2,
+) -> dict[str, list[Inflection]]:
+    """Map the inflected forms of the keys of a dictionary to all their inflections"""
+    rules_by_ending = group_rules(deinflector.rules)
+    forms: dict[str, dict[tuple[str, int], Inflection]] = {}
+    for key, ids in index.keys.items():
+        type_ = 0
+        for entry_id in ids:
+            type_ |= index.types[entry_id]
+        if not type_ & 0x7f:
+            continue  # only inflectable words have other bits than bit 7
+        for form, inflection in inflect(key, type_, rules_by_ending, max_depth):
+            # like the set of candidates of Deinflector, keeping the shortest reasons
+            forms.setdefault(form, {}).setdefault((inflection.word, inflection.type_), inflection)
+    # a form can also come from other words with more rules than max_depth
+    for form, inflections in forms.items():
+        for candidate in deinflector(form):
+            if candidate.word == form or candidate in inflections:
+                continue  # the form itself is always looked up
+            ids = index.keys.get(candidate.word, [])
+            if any(index.types[entry_id] & candidate.type_ for entry_id in ids):
+                inflections[candidate] = Inflection(candidate.word, candidate.type_, ())
+    return {form: list(inflections.values()) for form, inflections in forms.items()}
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def write_inflections(forms: dict[str, list[Inflection]], n_entries: int, filename: str) -> None:
+    endings: dict[str, int] = {}
+    chains: dict[tuple[str, ...], int] = {}
+    postings: dict[str, list[int]] = {}
+    for form, inflections in forms.items():
+        values = postings[form] = []
+        for inflection in inflections:
+            prefix_length = common_prefix_length(form, inflection.word)
+            ending = endings.setdefault(inflection.word[prefix_length:], len(endings))
+            chain = chains.setdefault(inflection.reasons, len(chains))
+            values.append((len(form) - prefix_length) << 16 | ending)
+            values.append(inflection.type_ << 16 | chain)
+    if len(endings) > max_numbers or len(chains) > max_numbers:
+        msg = 'too many endings or chains of reasons; use a smaller depth'
+        raise ValueError(msg)
+    metadata = pickle.dumps((list(endings), list(chains)), protocol=pickle.HIGHEST_PROTOCOL)
+    write_key_index(postings, n_entries, filename, metadata)
+
+
+class InflectionIndex:
+    """Read-only access to a file written by write_inflections"""
+    def __init__(self, filename: str) -> None:
+        self.keys = KeyIndex(filename)
+        self.endings, self.chains = pickle.loads(self.keys.metadata)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, form: str) -> list[Inflection]:
+        """Return the inflections of the dictionary words that form can be an inflection of"""
+        postings = self.keys.get(form)
+        return [
+            Inflection(form[:len(form) - (ending >> 16)] + self.endings[ending & 0xffff], type_ >> 16,
+                       self.chains[type_ & 0xffff])
+            for ending, type_ in zip(postings[::2], postings[1::2])
+        ]
+
+
+# index of the default dictionary, looked for on first use (None if not built)
+inflections: Optional[InflectionIndex] = None
+looked_for_inflections = False
+
+
+def get_inflections() -> Optional[InflectionIndex]:
+    global inflections, looked_for_inflections
+    if not looked_for_inflections:
+        looked_for_inflections = True
+        # made from the entries of the source, not those added to its compiled index by update.py
+        if is_up_to_date(default_inflections, default_edict) and is_up_to_date(default_inflections, default_index):
+            # ValueError when written by another version
+            with contextlib.suppress(ValueError):
+                inflections = InflectionIndex(default_inflections)
+    return inflections
+
+
+def main() -> None:
+    from .build import build
+    from .index import load_index
+
+    parser = argparse.ArgumentParser(description='Write the index of inflected forms (FILENAME.inf) of dictionaries')
+    parser.add_argument('filenames', nargs='+', help='dictionaries in EDICT2 format')
+    parser.add_argument('--depth', type=int, default=2, help='maximum number of rules per form (default: 2)')
+    args = parser.parse_args()
+    deinflector = Deinflector()
+    for filename in args.filenames:
+        index = load_index(filename + '.idx') if is_up_to_date(filename + '.idx', filename) else None
+        if index is None:
+            index = build(filename)
+        forms = build_inflections(index, deinflector, args.depth)
+        write_inflections(forms, len(index.entries), filename + '.inf')
+        n_inflections = sum(len(inflections) for inflections in forms.values())
+        size = os.path.getsize(filename + '.inf')
+        print(f'{filename}.inf: {len(forms)} forms, {n_inflections} inflections, {size / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
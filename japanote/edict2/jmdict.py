@@ -0,0 +1,166 @@
+"""Import JMdict and JMnedict XML files
+
+Run from the folder of the add-on:
+
+    python -m edict2.jmdict JMdict_e.xml -o edict2/edict2.idx
+    python -m edict2.jmdict JMnedict.xml -o edict2/enamdict.idx
+
+The XML file is parsed incrementally and each entry is discarded once it has
+been converted, so memory only grows with the resulting index. Entries are
+converted to EDICT2 lines (keeping reading restrictions, and the
+part-of-speech of every sense) and indexed like EDICT2 files by build.py.
+"""
+import argparse
+import re
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+from typing import Optional
+
+from .build import index_words
+from .index import save_index
+from .search import Word, parse_line, type_from_pos
+
+entity_pattern = re.compile(r'<!ENTITY\s+(\S+)\s+"([^"]*)">')
+xml_lang = '{http://www.w3.org/XML/1998/namespace}lang'
+
+# priority markers that correspond to (P) in EDICT2
+common_priorities = {'news1', 'ichi1', 'spec1', 'spec2', 'gai1'}
+
+# JMnedict name types, abbreviated as in ENAMDICT
+name_types = {
+    'surname': 's',
+    'place': 'p',
+    'unclass': 'u',
+    'given': 'g',
+    'fem': 'f',
+    'masc': 'm',
+    'person': 'h',
+    'product': 'pr',
+    'company': 'c',
+    'organization': 'o',
+    'station': 'st',
+    'work': 'wk',
+}
+
+
+def read_entities(filename: str) -> dict[str, str]:
+    """Map the expansion of each entity declared in the DTD back to its name"""
+    prolog = []
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            prolog.append(line)
+            if line.startswith(']>'):
+                break
+    return {text: name for name, text in entity_pattern.findall(''.join(prolog))}
+
+
+def clean(text: str) -> str:
+    # slashes separate glosses in EDICT2
+    return text.replace('/', '／').strip()
+
+
+def read_senses(entry: ET.Element, entities: dict[str, str]) -> tuple[list[tuple[list[str], list[str]]], int]:
+    """Return the tags and glosses of the senses (JMdict) or translations (JMnedict) of an entry, and its type mask"""
+    senses = []
+    type_ = type_from_pos([])
+    pos: list[str] = []
+    for sense in entry.iter('sense'):
+        # part-of-speech carries over to the following senses when not given
+        # (EDICT2 only repeats it when it changes)
+        sense_pos = [entities.get(p.text or '', p.text or '') for p in sense.iter('pos')]
+        pos = sense_pos or pos
+        type_ |= type_from_pos(pos)
+        misc = [entities.get(m.text or '', m.text or '') for m in sense.iter('misc')]
+        glosses = [
+            clean(gloss.text or '')
+            for gloss in sense.iter('gloss')
+            if gloss.get(xml_lang, 'eng') == 'eng'
+        ]
+        if glosses:
+            senses.append((sense_pos + misc, glosses))
+    for trans in entry.iter('trans'):
+        types = [entities.get(t.text or '', t.text or '') for t in trans.iter('name_type')]
+        types = [name_types.get(name, name) for name in types]
+        glosses = [clean(det.text or '') for det in trans.iter('trans_det')]
+        if glosses:
+            senses.append((types, glosses))
+    return senses, type_
+
+
+def entry_to_line(entry: ET.Element, entities: dict[str, str]) -> tuple[str, int]:
+    """Convert a JMdict or JMnedict entry to an EDICT2 line and its type mask"""
+    common = False
+
+    # writings
+    writings = []
+    for k_ele in entry.iter('k_ele'):
+        keb = k_ele.findtext('keb', '')
+        if any(pri.text in common_priorities for pri in k_ele.iter('ke_pri')):
+            common = True
+            keb += '(P)'
+        writings.append(keb)
+
+    # readings, with restrictions to some of the writings
+    readings = []
+    for r_ele in entry.iter('r_ele'):
+        reb = r_ele.findtext('reb', '')
+        restrictions = [restr.text or '' for restr in r_ele.iter('re_restr')]
+        if restrictions:
+            reb += '({})'.format(';'.join(restrictions))
+        if any(pri.text in common_priorities for pri in r_ele.iter('re_pri')):
+            common = True
+            reb += '(P)'
+        readings.append(reb)
+
+    senses, type_ = read_senses(entry, entities)
+
+    fields = []
+    for i, (tags, glosses) in enumerate(senses, start=1):
+        prefix = ''
+        if tags:
+            prefix += '({}) '.format(','.join(tags))
+        if len(senses) > 1:
+            prefix += f'({i}) '
+        fields.append(prefix + glosses[0])
+        fields.extend(glosses[1:])
+    if common:
+        fields.append('(P)')
+    fields.append('EntL' + entry.findtext('ent_seq', ''))
+
+    head = ';'.join(writings) + ' [' + ';'.join(readings) + ']' if writings else ';'.join(readings)
+    return '{} /{}/\n'.format(head, '/'.join(fields)), type_
+
+
+def iter_words(filename: str) -> Iterator[Word]:
+    """Stream the entries of a JMdict or JMnedict file as words"""
+    entities = read_entities(filename)
+    root: Optional[ET.Element] = None
+    for event, element in ET.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+        if element.tag != 'entry':
+            continue
+        line, type_ = entry_to_line(element, entities)
+        # free the entry, and the references to it from the root
+        element.clear()
+        assert root is not None
+        root.clear()
+        word = parse_line(line)
+        if word is None:
+            continue
+        word._type = type_
+        yield word
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Build the compiled index of a JMdict or JMnedict file')
+    parser.add_argument('filename', help='JMdict or JMnedict XML file')
+    parser.add_argument('-o', '--output', required=True, help='index file (e.g. edict2/edict2.idx)')
+    args = parser.parse_args()
+    save_index(index_words(iter_words(args.filename)), args.output)
+
+
+if __name__ == '__main__':
+    main()
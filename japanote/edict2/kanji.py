@@ -1,6 +1,8 @@
 import os.path
 import re
 
+from .blocks import BlockFile
+
 default_kanjidic = os.path.join(os.path.dirname(__file__), 'kanjidic')
 
 
@@ -65,8 +67,12 @@ def compound_readings(readings: set[str]) -> set[str]:
 
 
 def load_kanjidic(filename: str = default_kanjidic) -> dict[str, Kanji]:
-    with open(filename, mode='rb') as f:
-        edict_data = f.read().decode('euc_jp')
+    if not os.path.exists(filename) and os.path.exists(filename + '.blk'):
+        # compressed copy shipped instead of the original file (see blocks.py)
+        edict_data = ''.join(BlockFile(filename + '.blk'))
+    else:
+        with open(filename, mode='rb') as f:
+            edict_data = f.read().decode('euc_jp')
 
     kanjidic = {}
     line_pattern = re.compile(r'(?m)^(.) (?:[0-9A-F]{4}) (?:(?:[A-Z]\S*) )*([^{]*?) (?:T[^{]*?)?((?:\{.*?\} )*\{.*?\})')
@@ -0,0 +1,221 @@
+"""Exact-lookup index of the writings and readings of a dictionary
+
+Run from the folder of the add-on:
+
+    python -m edict2.keyindex edict2/edict2 edict2/enamdict
+
+Keys are placed with a minimal perfect hash (hash and displace): each key
+falls in a bucket, and each bucket stores the displacement that sends its
+keys to distinct slots, so that n keys fill exactly n slots. The key stored
+in the slot is compared with the one looked up, since any string is sent to
+some slot.
+
+The file is mapped in memory and read in place (native byte order):
+
+    magic, numbers of keys, buckets and entries, salt, sizes     (header)
+    displacements of the buckets, d0 << 32 | d1                  (uint64)
+    offsets of the keys in the key bytes, then of their postings (uint32)
+    postings: values of each key, e.g. sorted entry numbers      (uint32)
+    key bytes: UTF-8 keys, in the order of the slots             (bytes)
+    metadata of the user of the index (e.g. inflections.py)      (bytes)
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+from array import array
+from collections.abc import Iterator, Sequence
+from hashlib import blake2b
+from typing import Optional
+
+magic = b'JNKEY\x00\x00\x02'
+header_format = '=8sIII16sQQ'
+header_size = struct.calcsize(header_format)
+# average number of keys per bucket
+bucket_keys = 4
+# displacements tried for a bucket before another salt is drawn
+max_attempts = 10000
+
+
+def key_hash(key: bytes, salt: bytes) -> int:
+    return int.from_bytes(blake2b(key, digest_size=16, salt=salt).digest(), 'little')
+
+
+def align(size: int) -> int:
+    return -(-size // 8) * 8
+
+
+def place(hashes: list[int], n_buckets: int, rng: random.Random) -> Optional[tuple[array, list[int]]]:
+    """Return the displacements of the buckets and the slot of each key (None on failure)"""
+    n = len(hashes)
+    buckets: list[list[int]] = [[] for _ in range(n_buckets)]
+    for i, h in enumerate(hashes):
+        buckets[(h & 0xffffffff) % n_buckets].append(i)
+
+    # free slots, with the position of each one in the list for O(1) removal
+    free = list(range(n))
+    position = list(range(n))
+
+    def take(slot: int) -> None:
+        i = position[slot]
+        last = free[-1]
+        free[i] = last
+        position[last] = i
+        free.pop()
+
+    displacements = array('Q', bytes(8 * n_buckets))
+    slots = [0] * n
+    taken = bytearray(n)
+    # large buckets first, while most slots are free
+    for bucket_id in sorted(range(n_buckets), key=lambda bucket_id: -len(buckets[bucket_id])):
+        bucket = buckets[bucket_id]
+        if not bucket:
+            break
+        for _ in range(max_attempts):
+            d0 = rng.randrange(n) if len(bucket) > 1 else 0
+            base = [((hashes[i] >> 32 & 0xffffffff) + d0 * (hashes[i] >> 64)) % n for i in bucket]
+            # the first key goes to a random free slot, the others follow
+            d1 = (free[rng.randrange(len(free))] - base[0]) % n
+            positions = [(p + d1) % n for p in base]
+            if len(set(positions)) == len(positions) and not any(taken[p] for p in positions):
+                break
+        else:
+            return None
+        displacements[bucket_id] = d0 << 32 | d1
+        for i, p in zip(bucket, positions):
+            slots[i] = p
+            taken[p] = 1
+            take(p)
+    return displacements, slots
+
+
+def write_key_index(keys: dict[str, list[int]], n_entries: int, filename: str, metadata: bytes = b'') -> None:
+    """Write the index of keys (key → sorted entry numbers) of a dictionary of n_entries"""
+    encoded = [key.encode() for key in keys]
+    n = len(encoded)
+    n_buckets = max(1, n // bucket_keys)
+    rng = random.Random(0)
+    while True:
+        salt = rng.randbytes(16)
+        hashes = [key_hash(key, salt) for key in encoded]
+        placed = place(hashes, n_buckets, rng)
+        if placed is not None:
+            break
+    displacements, slots = placed
+
+    by_slot: list[int] = [0] * n
+    for i, slot in enumerate(slots):
+        by_slot[slot] = i
+    postings = list(keys.values())
+    key_offsets = array('I', [0])
+    posting_offsets = array('I', [0])
+    all_postings = array('I')
+    key_bytes = bytearray()
+    for i in by_slot:
+        key_bytes += encoded[i]
+        key_offsets.append(len(key_bytes))
+        all_postings.extend(postings[i])
+        posting_offsets.append(len(all_postings))
+
+    # the previous file may still be mapped by a loaded dictionary
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'wb') as f:
+        header = struct.pack(header_format, magic, n, n_buckets, n_entries, salt, len(all_postings), len(metadata))
+        # sections start on 8-byte boundaries, so that they can be cast in place
+        for data in (header, displacements.tobytes(), key_offsets.tobytes(), posting_offsets.tobytes(),
+                     all_postings.tobytes(), bytes(key_bytes), metadata):
+            f.write(data)
+            f.write(bytes(align(len(data)) - len(data)))
+    os.replace(temporary_filename, filename)
+
+
+class KeyIndex:
+    """Read-only access to a file written by write_key_index
+
+    Raises ValueError for files written by another version of the add-on.
+    """
+    def __init__(self, filename: str) -> None:
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(magic)] != magic:
+            self.data.close()
+            msg = f'{filename} is not a key index'
+            raise ValueError(msg)
+        self.n_keys: int
+        self.n_buckets: int
+        self.n_entries: int
+        self.salt: bytes
+        self.n_keys, self.n_buckets, self.n_entries, self.salt, n_postings, metadata_size = struct.unpack_from(
+            header_format, self.data,
+        )[1:]
+
+        view = memoryview(self.data)
+        start = align(header_size)
+
+        def section(size: int) -> memoryview:
+            nonlocal start
+            data = view[start:start + size]
+            start += align(size)
+            return data
+
+        self.displacements = section(8 * self.n_buckets).cast('Q')
+        self.key_offsets = section(4 * (self.n_keys + 1)).cast('I')
+        self.posting_offsets = section(4 * (self.n_keys + 1)).cast('I')
+        self.postings = section(4 * n_postings).cast('I')
+        self.key_bytes = section(self.key_offsets[-1])
+        self.metadata = bytes(section(metadata_size))
+
+    def __len__(self) -> int:
+        return self.n_keys
+
+    def __iter__(self) -> Iterator[str]:
+        for slot in range(self.n_keys):
+            yield bytes(self.key_bytes[self.key_offsets[slot]:self.key_offsets[slot + 1]]).decode()
+
+    def __contains__(self, key: str) -> bool:
+        return self.find(key) is not None
+
+    def find(self, key: str) -> Optional[int]:
+        """Return the slot of key (None if it is not in the index)"""
+        if not self.n_keys:
+            return None
+        data = key.encode()
+        h = key_hash(data, self.salt)
+        d = self.displacements[(h & 0xffffffff) % self.n_buckets]
+        slot = ((h >> 32 & 0xffffffff) + (d >> 32) * (h >> 64) + (d & 0xffffffff)) % self.n_keys
+        if self.key_bytes[self.key_offsets[slot]:self.key_offsets[slot + 1]] != data:
+            return None
+        return slot
+
+    def get(self, key: str) -> Sequence[int]:
+        """Return the postings of key (empty if it is not in the index)"""
+        slot = self.find(key)
+        if slot is None:
+            return ()
+        return self.postings[self.posting_offsets[slot]:self.posting_offsets[slot + 1]]
+
+    def close(self) -> None:
+        for view in (self.displacements, self.key_offsets, self.posting_offsets, self.postings, self.key_bytes):
+            view.release()
+        self.data.close()
+
+
+def main() -> None:
+    from .build import build
+    from .index import load_index
+    from .search import is_up_to_date
+
+    parser = argparse.ArgumentParser(description='Write the key indexes (FILENAME.keys) of dictionary files')
+    parser.add_argument('filenames', nargs='+', help='dictionaries in EDICT2 format')
+    args = parser.parse_args()
+    for filename in args.filenames:
+        # entries are numbered like in the compiled index, when it is up to date
+        index = load_index(filename + '.idx') if is_up_to_date(filename + '.idx', filename) else None
+        if index is None:
+            index = build(filename)
+        write_key_index(index.keys, len(index.entries), filename + '.keys')
+
+
+if __name__ == '__main__':
+    main()
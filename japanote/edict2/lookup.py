@@ -0,0 +1,101 @@
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from . import search, trace
+from .deinflect import Candidate, Deinflector
+from .inflections import get_inflections
+from .search import Edict, Word, get_edict, get_enamdict
+
+deinflector: Optional[Deinflector] = None
+# ENAMDICT being loaded in the background (see preload_enamdict)
+enamdict_loading: Optional['Future[Edict]'] = None
+
+
+def get_deinflector() -> Deinflector:
+    global deinflector
+    if deinflector is None:
+        deinflector = Deinflector()
+    return deinflector
+
+
+def deinflect(word: str) -> set[Candidate]:
+    with trace.span('Deinflector'):
+        candidates = set(get_deinflector()(word))
+    trace.count('deinflection candidates', len(candidates))
+    return candidates
+
+
+def match(edict: Edict, candidates: Iterable[Candidate]) -> Iterator[Word]:
+    """Iterate through the entries of the candidates whose type matches"""
+    for candidate in candidates:
+        with trace.span('Edict.search'):
+            words = list(edict.search(candidate.word))
+        with trace.span('get_type filtering'):
+            matches = [word2 for word2 in words if word2.get_type() & candidate.type_]
+        yield from matches
+
+
+def has_overlay_entries(edict: Edict) -> bool:
+    return edict.overlay is not None and next(edict.overlay.entries(), None) is not None
+
+
+def lookup(word: str, is_proper_noun: bool = False) -> Iterator[Word]:
+    """Iterate through the entries matching a word in kana or kanji
+
+    Regular words are deinflected first and only the entries whose type
+    matches the deinflection are kept. When the index of inflections was
+    built (see inflections.py), the deinflections of the forms it has are
+    read from it instead. Proper nouns are looked up as is in ENAMDICT.
+    """
+    if is_proper_noun:
+        with trace.span('enamdict.search'):
+            words = list(get_enamdict().search(word))
+        yield from words
+        return
+    edict = get_edict()
+    inflections = get_inflections()
+    # the index does not have the inflected forms of the user dictionary
+    if inflections is None or has_overlay_entries(edict):
+        yield from match(edict, deinflect(word))
+        return
+    with trace.span('InflectionIndex.get'):
+        found = inflections.get(word)
+    if not found:
+        # not inflected, or with more rules than the index has
+        yield from match(edict, deinflect(word))
+        return
+    candidates = {Candidate(word, 0xff)}
+    candidates.update(Candidate(inflection.word, inflection.type_) for inflection in found)
+    yield from match(edict, candidates)
+
+
+def preload_enamdict() -> None:
+    """Start loading ENAMDICT in a background thread, unless it is loaded or loading already"""
+    global enamdict_loading
+    if search.enamdict is not None or (enamdict_loading is not None and not enamdict_loading.done()):
+        return
+    # the future holds the error of loading (e.g. no ENAMDICT) for lookup_with_names
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='japanote-enamdict')
+    enamdict_loading = executor.submit(get_enamdict)
+    executor.shutdown(wait=False)
+
+
+def lookup_with_names(word: str) -> Iterator[Word]:
+    """Like lookup(), with the entries of ENAMDICT when EDICT has none
+
+    ENAMDICT is loaded in the background while EDICT is searched, so that
+    falling back to it does not wait for a whole load after the first search.
+    """
+    preload_enamdict()
+    words = list(lookup(word))
+    if not words:
+        trace.count('ENAMDICT fallbacks')
+        try:
+            if enamdict_loading is not None:
+                with trace.span('wait for enamdict'):
+                    enamdict_loading.result()
+        except OSError:
+            return  # no ENAMDICT to fall back to
+        words = list(lookup(word, is_proper_noun=True))
+    yield from words
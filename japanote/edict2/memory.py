@@ -0,0 +1,135 @@
+"""Memory accounting of the loaded dictionaries
+
+Run from the folder of the add-on:
+
+    python -m edict2.memory
+
+Deep sizes follow references from each structure (containers, instance
+dictionaries and slots) and count every object once per structure, so
+objects shared between structures (e.g. interned strings) are counted in
+each of them.
+"""
+import sys
+import tracemalloc
+from typing import Any, Callable, NamedTuple, Optional
+
+from . import furigana, lookup, search
+
+
+class Usage(NamedTuple):
+    name: str
+    objects: int
+    bytes: int
+
+
+class LoadTrace(NamedTuple):
+    name: str
+    current: int  # bytes still allocated after loading
+    peak: int  # highest allocated bytes while loading
+    top: list[str]  # lines of code that allocated most of current
+
+
+def deep_size(root: Any) -> tuple[int, int]:
+    """Return the number of objects reachable from root and their total size in bytes"""
+    seen: set[int] = set()
+    stack = [root]
+    n_objects = 0
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        n_objects += 1
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+            slots = getattr(type(obj), '__slots__', ())
+            stack.extend(getattr(obj, name) for name in slots if hasattr(obj, name))
+    return n_objects, size
+
+
+def loaded_structures() -> dict[str, Any]:
+    """Return the structures of the engines that are currently loaded"""
+    structures = {
+        'edict': search.edict,
+        'enamdict': search.enamdict,
+        'deinflector': lookup.deinflector,
+        'kanjidic': furigana.kanjidic,
+    }
+    return {name: structure for name, structure in structures.items() if structure is not None}
+
+
+def loaders() -> dict[str, Callable[[], Any]]:
+    return {
+        'edict': search.get_edict,
+        'enamdict': search.get_enamdict,
+        'deinflector': lookup.get_deinflector,
+        'kanjidic': furigana.get_kanjidic,
+    }
+
+
+def trace_load(name: str, load: Callable[[], Any], n_top: int = 5) -> LoadTrace:
+    """Call load while tracing memory allocations"""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    snapshot_before = tracemalloc.take_snapshot()
+    load()
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    if not was_tracing:
+        tracemalloc.stop()
+    top = [str(stat) for stat in snapshot.compare_to(snapshot_before, 'lineno')[:n_top]]
+    return LoadTrace(name, current - before, peak - before, top)
+
+
+def measure(structures: Optional[dict[str, Any]] = None) -> list[Usage]:
+    if structures is None:
+        structures = loaded_structures()
+    return [Usage(name, *deep_size(structure)) for name, structure in structures.items()]
+
+
+def report(load_missing: bool = False, extra: Optional[dict[str, Any]] = None) -> str:
+    """Return a plain text table of the memory used by the engines
+
+    With load_missing, the structures that are not loaded yet are loaded
+    while tracing allocations. Structures in extra are measured as well.
+    """
+    traces = []
+    if load_missing:
+        loaded = loaded_structures()
+        traces = [trace_load(name, load) for name, load in loaders().items() if name not in loaded]
+
+    lines = [f'{"structure":32} {"objects":>12} {"size (MiB)":>12}']
+    usages = measure({**loaded_structures(), **(extra or {})})
+    lines.extend(f'{usage.name:32} {usage.objects:12} {usage.bytes / 2**20:12.1f}' for usage in usages)
+    if usages:
+        total_objects = sum(usage.objects for usage in usages)
+        total_bytes = sum(usage.bytes for usage in usages)
+        lines.append(f'{"total":32} {total_objects:12} {total_bytes / 2**20:12.1f}')
+    missing = [name for name in loaders() if name not in loaded_structures()]
+    if missing:
+        lines.append('not loaded: ' + ', '.join(missing))
+    for load_trace in traces:
+        lines.append('')
+        lines.append(
+            f'loading {load_trace.name}: {load_trace.current / 2**20:.1f} MiB allocated'
+            f' (peak {load_trace.peak / 2**20:.1f} MiB)',
+        )
+        lines.extend(f'    {line}' for line in load_trace.top)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(report(load_missing=True))
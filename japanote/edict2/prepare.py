@@ -0,0 +1,47 @@
+"""Furigana and definitions of words, computed before creating their notes
+
+Matching furigana is a breadth-first search over the readings of KANJIDIC
+(see furigana.py), which makes most of the time spent creating notes for
+words whose furigana were not indexed (see build.py). prepare_words
+computes the furigana of many words at once, each distinct (kanji, kana)
+pair only once, and caches them on the words with their definitions, so
+that filling their notes afterwards computes nothing.
+
+With several processes, KANJIDIC is loaded before the pool is started:
+forked workers share it, and other workers load it once when they start.
+"""
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+from . import trace
+from .furigana import furigana_from_kanji_kana, get_kanjidic
+from .search import Word
+
+# pairs matched by a worker at once
+chunk_size = 256
+
+
+def _furigana_chunk(pairs: list[tuple[str, str]]) -> list[str]:
+    return [furigana_from_kanji_kana(kanji, kana) for kanji, kana in pairs]
+
+
+def chunks(pairs: list[tuple[str, str]], size: int) -> Iterator[list[tuple[str, str]]]:
+    for i in range(0, len(pairs), size):
+        yield pairs[i:i + size]
+
+
+def prepare_words(words: Sequence[Word], processes: int = 1) -> None:
+    """Compute the furigana and the definitions of words, in a process pool when there are several processes"""
+    with trace.span('prepare_words'):
+        get_kanjidic()
+        pairs = list(dict.fromkeys((word.kanji, word.kana) for word in words if word._furigana is None))
+        if processes == 1 or len(pairs) <= chunk_size:
+            furigana = _furigana_chunk(pairs)
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=get_kanjidic) as executor:
+                furigana = [f for chunk in executor.map(_furigana_chunk, chunks(pairs, chunk_size)) for f in chunk]
+        furigana_of_pair = dict(zip(pairs, furigana))
+        for word in words:
+            if word._furigana is None:
+                word._furigana = furigana_of_pair[word.kanji, word.kana]
+            word.get_meanings_html()
@@ -1,8 +1,16 @@
 import os.path
+import pickle
 import re
-from typing import Iterator, Optional
+import threading
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple, Optional
 
+from . import trace
+from .blocks import BlockFile
+from .collation import CollationKey, kana_key
 from .furigana import furigana_from_kanji_kana
+from .index import DictionaryIndex, load_index
+from .keyindex import KeyIndex
 
 # default filenames
 default_edict = os.path.join(os.path.dirname(__file__), 'edict2')
@@ -11,7 +19,70 @@ default_enamdict = os.path.join(os.path.dirname(__file__), 'enamdict')
 # pre-compile regular expressions
 edict_line_pattern = re.compile(r'(?m)^(\S*) (?:\[(\S*?)\] )?/(.*)/$')
 common_marker = re.compile(r'\([^)]*\)')
+sequence_number_pattern = re.compile(r'^EntL([0-9]+)X?$')
 gloss_pattern = re.compile(r'^(?:\(([^0-9]\S*)\) )?(?:\(([0-9]+)\) )?(.*)')
+pos_pattern = re.compile(r'\(([a-z][a-z0-9-]*(?:,[a-z][a-z0-9-]*)*)\)')
+kanji_pattern = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々]')
+
+# facets of entries, for filtering results (see Word.get_facets)
+facets = {
+    'common': 1<<0,  # marked (P)
+    'kanji': 1<<1,  # written with kanji
+    'noun': 1<<2,
+    'verb': 1<<3,
+    'adjective': 1<<4,
+    'adverb': 1<<5,
+    'expression': 1<<6,
+    # name types of ENAMDICT
+    'surname': 1<<8,
+    'given': 1<<9,
+    'person': 1<<10,  # full name
+    'place': 1<<11,
+    'station': 1<<12,
+    'company': 1<<13,
+    'organization': 1<<14,
+    'product': 1<<15,
+    'work': 1<<16,
+    'unclassified': 1<<17,
+}
+# part-of-speech codes of verbs in JMdict (vi and vt only say whether a verb is transitive)
+verb_codes = frozenset({
+    'v1', 'v1-s', 'v-unspec', 'vk', 'vn', 'vr', 'vs', 'vs-c', 'vs-i', 'vs-s', 'vz',
+    'v2a-s', 'v2b-k', 'v2b-s', 'v2d-k', 'v2d-s', 'v2g-k', 'v2g-s', 'v2h-k', 'v2h-s', 'v2k-k', 'v2k-s', 'v2m-k',
+    'v2m-s', 'v2n-s', 'v2r-k', 'v2r-s', 'v2s-s', 'v2t-k', 'v2t-s', 'v2w-s', 'v2y-k', 'v2y-s', 'v2z-s',
+    'v4b', 'v4g', 'v4h', 'v4k', 'v4m', 'v4n', 'v4r', 'v4s', 'v4t',
+    'v5aru', 'v5b', 'v5g', 'v5k', 'v5k-s', 'v5m', 'v5n', 'v5r', 'v5r-i', 'v5s', 'v5t', 'v5u', 'v5u-s', 'v5uru',
+})
+# ENAMDICT tags (as written by jmdict.py) → facets
+name_tags = {
+    's': 'surname',
+    'g': 'given',
+    'f': 'given',  # feminine
+    'm': 'given',  # masculine
+    'h': 'person',
+    'p': 'place',
+    'st': 'station',
+    'c': 'company',
+    'o': 'organization',
+    'pr': 'product',
+    'wk': 'work',
+    'u': 'unclassified',
+}
+
+
+# between the fields of a stored collation (see encode_collation); not in EDICT2 lines
+collation_separator = '\x1f'
+# sort key of the entries without a JMdict ID (those of ENAMDICT), before the others
+no_sequence_id = 0
+
+
+class Collation(NamedTuple):
+    """Sort keys of a word, in the order of the columns of the search window"""
+    kanji: CollationKey
+    kana: CollationKey
+    template: tuple[CollationKey, CollationKey]
+    sequence: int  # no_sequence_id for entries without one
+    definition: tuple[bool, str]  # common words first
 
 
 class Word:
@@ -26,20 +97,58 @@ class Word:
         self.kana = self.readings[0] if self.readings else self.kanji
 
         self._furigana: Optional[str] = None
+        self._meanings_html: Optional[str] = None
+        self._collation: Optional[Collation] = None
+        # stored form of the collation, decoded on first use (see encode_collation)
+        self._collation_record: Optional[str] = None
+        self._type: Optional[int] = None
+        self._facets: Optional[int] = None
 
     def __repr__(self) -> str:
         return f'<{self.kanji}>'
 
-    def get_sequence_number(self) -> str:
+    def get_sequence_number(self) -> Optional[str]:
+        """Return the sequence number of the entry, such as EntL1358280X (None for names of ENAMDICT)"""
         last_gloss = self.glosses.split('/')[-1]
-        assert last_gloss[:4] == 'EntL'
-        return last_gloss
+        return last_gloss if last_gloss[:4] == 'EntL' else None
+
+    def get_sequence_id(self) -> int:
+        """Return the JMdict ID of an entry of EDICT"""
+        sequence_number = self.get_sequence_number()
+        assert sequence_number is not None
+        sequence_id = parse_sequence_number(sequence_number)
+        assert sequence_id is not None
+        return sequence_id
+
+    def is_common(self) -> bool:
+        return '(P)' in self.glosses.split('/')
+
+    def get_collation(self) -> Collation:
+        if self._collation is None:
+            if self._collation_record is not None:
+                self._collation = decode_collation(self, self._collation_record)
+            else:
+                self._collation = self._compute_collation()
+        return self._collation
+
+    def _compute_collation(self) -> Collation:
+        kanji = kana_key(self.kanji)
+        kana = kana_key(self.kana)
+        sequence_id = parse_sequence_number(self.glosses.rsplit('/', 1)[-1])
+        return Collation(
+            kanji=kanji,
+            kana=kana,
+            template=(kanji, kana),
+            sequence=no_sequence_id if sequence_id is None else sequence_id,
+            definition=(not self.is_common(), '; '.join(self.get_meanings()).casefold()),
+        )
 
     def get_furigana(self) -> str:
         if self._furigana is None:
             kanji = self.kanji
             kana = self.kana
-            self._furigana = furigana_from_kanji_kana(kanji, kana)
+            with trace.span('Word.get_furigana'):
+                self._furigana = furigana_from_kanji_kana(kanji, kana)
         return self._furigana
 
     def get_meanings(self) -> list[str]:
@@ -65,15 +174,22 @@ class Word:
         return meanings
 
     def get_meanings_html(self) -> str:
-        meanings = self.get_meanings()
-        if len(meanings) == 1:
-            return meanings[0]
-        items = ('<li>%s</li>' % meaning for meaning in meanings)
-        list_ = '<ol>%s</ol>' % ''.join(items)
-        return list_
+        if self._meanings_html is None:
+            meanings = self.get_meanings()
+            if len(meanings) == 1:
+                self._meanings_html = meanings[0]
+            else:
+                items = ('<li>%s</li>' % meaning for meaning in meanings)
+                self._meanings_html = '<ol>%s</ol>' % ''.join(items)
+        return self._meanings_html
 
     def get_type(self) -> int:
         """Return type mask for deinflections"""
+        if self._type is None:
+            self._type = self._compute_type()
+        return self._type
+
+    def _compute_type(self) -> int:
         type_ = 1<<7
         if re.search(r'\bv1\b', self.glosses):
             type_ |= 1<<0
@@ -87,47 +203,451 @@ class Word:
             type_ |= 1<<4
         return type_
 
+    def get_facets(self) -> int:
+        """Return mask of facets (see facets)"""
+        if self._facets is None:
+            self._facets = self._compute_facets()
+        return self._facets
+
+    def _compute_facets(self) -> int:
+        facets_ = 0
+        if self.is_common():
+            facets_ |= facets['common']
+        if any(kanji_pattern.search(writing) for writing in self.writings):
+            facets_ |= facets['kanji']
+        for marker in pos_pattern.findall(self.glosses):
+            for code in marker.split(','):
+                if code == 'n' or code.startswith('n-'):
+                    facets_ |= facets['noun']
+                elif code in verb_codes:
+                    facets_ |= facets['verb']
+                elif code.startswith('adj'):
+                    facets_ |= facets['adjective']
+                elif code.startswith('adv'):
+                    facets_ |= facets['adverb']
+                elif code == 'exp':
+                    facets_ |= facets['expression']
+                elif code in name_tags:
+                    facets_ |= facets[name_tags[code]]
+        return facets_
+
+    def has_facets(self, required: int, excluded: int = 0) -> bool:
+        """Whether the word has all the required facets and none of the excluded ones"""
+        word_facets = self.get_facets()
+        return word_facets & required == required and not word_facets & excluded
+
+
+def type_from_pos(codes: Iterable[str]) -> int:
+    """Return type mask for deinflections from JMdict part-of-speech codes"""
+    type_ = 1<<7
+    for code in codes:
+        if code == 'v1':
+            type_ |= 1<<0
+        elif code.startswith('v5'):
+            type_ |= 1<<1
+        elif code == 'adj-i':
+            type_ |= 1<<2
+        elif code == 'vk':
+            type_ |= 1<<3
+        elif code == 'vs' or code.startswith('vs-'):
+            type_ |= 1<<4
+    return type_
+
+
+def parse_sequence_number(sequence_number: str) -> Optional[int]:
+    """Return the JMdict ID of a sequence number such as EntL1150710X (None if it is not one)"""
+    match = sequence_number_pattern.match(sequence_number.strip())
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def encode_collation(collation: Collation) -> str:
+    """Return the keys of a collation that are not in the entry itself, as one string
+
+    The JMdict ID, whether the word is not common, the primary and secondary
+    keys of the kanji and the kana, and the text of the definition are
+    separated by collation_separator. A key equal to the next level (the
+    kanji or kana itself for the secondary key) is left empty, like the ID
+    of an entry without one.
+    """
+    sequence = '' if collation.sequence == no_sequence_id else str(collation.sequence)
+    fields = [sequence, str(int(collation.definition[0]))]
+    for key in (collation.kanji, collation.kana):
+        fields.append('' if key.primary == key.secondary else key.primary)
+        fields.append('' if key.secondary == key.tertiary else key.secondary)
+    fields.append(collation.definition[1])
+    return collation_separator.join(fields)
+
+
+def decode_collation(word: Word, record: str) -> Collation:
+    """Return the collation of word from a string returned by encode_collation"""
+    sequence, uncommon, kanji_primary, kanji_secondary, kana_primary, kana_secondary, definition = record.split(
+        collation_separator,
+    )
+    kanji_secondary = kanji_secondary or word.kanji
+    kana_secondary = kana_secondary or word.kana
+    kanji = CollationKey(kanji_primary or kanji_secondary, kanji_secondary, word.kanji)
+    kana = CollationKey(kana_primary or kana_secondary, kana_secondary, word.kana)
+    return Collation(
+        kanji=kanji,
+        kana=kana,
+        template=(kanji, kana),
+        sequence=int(sequence) if sequence else no_sequence_id,
+        definition=(uncommon == '1', definition),
+    )
+
+
+def decode_entry(index: DictionaryIndex, entry_id: int) -> Word:
+    """Return an entry of a compiled index (see build.py)"""
+    entry = index.entries[entry_id]
+    assert entry is not None  # removed by update.py
+    word = Word(*entry)
+    word._type = index.types[entry_id]
+    word._furigana = index.furigana[entry_id]
+    word._facets = index.facets[entry_id]
+    word._collation_record = index.collation[entry_id]
+    return word
+
+
+def parse_line(line: str) -> Optional[Word]:
+    """Parse a line of EDICT2 (None if it is not an entry)"""
+    match = edict_line_pattern.match(line)
+    if not match:
+        return None
+    swritings, sreadings, glosses = match.groups()
+    writings = common_marker.sub('', swritings).split(';')
+    readings = common_marker.sub('', sreadings).split(';') if sreadings else []
+    return Word(writings, readings, glosses, line)
+
 
 class Edict:
-    def __init__(self, filename: str = default_edict):
+    def __init__(self, filename: Optional[str] = default_edict):
+        """Load a dictionary in EDICT2 format (empty if filename is None)"""
         self.words: dict[str, Word | list[Word]] = {}
+        # entries looked up through a key index instead of self.words (see from_index)
+        self.key_index: Optional[KeyIndex] = None
+        self.index: Optional[DictionaryIndex] = None
+        self.indexed_words: list[Optional[Word]] = []  # decoded on first lookup
+        # JMdict ID → entry, built on first use
+        self.sequences: Optional[dict[int, Word]] = None
+        self.sequence_ids: Optional[dict[int, int]] = None  # JMdict ID → entry of the index
+        # entries searched before those of the dictionary, which they replace
+        # when they have the same JMdict ID (see userdict.py)
+        self.overlay: Optional[Edict] = None
+        if filename is None:
+            return
         with open(filename) as f:
             lines = iter(f)
             next(lines)  # skip header
             for line in lines:
-                match = edict_line_pattern.match(line)
-                if not match:
-                    continue
-
-                # gather information for new word
-                swritings, sreadings, glosses = match.groups()
-                writings = common_marker.sub('', swritings).split(';')
-                readings = common_marker.sub('', sreadings).split(';') if sreadings else []
-                word = Word(writings, readings, glosses, line)
-
-                # map writings and reading to word
-                for key in writings + readings:
-                    try:
-                        entries = self.words[key]
-                    except KeyError:
-                        self.words[key] = word
+                word = parse_line(line)
+                if word is not None:
+                    self.add(word)
+
+    @classmethod
+    def from_index(cls, index: DictionaryIndex, key_index: Optional[KeyIndex] = None) -> 'Edict':
+        """Create a dictionary from a compiled index (see build.py)
+
+        With a key index of the same entries (see keyindex.py), the keys are
+        looked up in the mapped file instead of being loaded in memory (the
+        index can then be loaded without its keys), and entries are only
+        decoded when they are looked up.
+        """
+        self = cls(None)
+        if key_index is not None and key_index.n_entries == len(index.entries):
+            self.key_index = key_index
+            self.index = index
+            self.indexed_words = [None] * len(index.entries)
+            return self
+        entries = [
+            decode_entry(index, entry_id) if entry is not None else None  # removed by update.py
+            for entry_id, entry in enumerate(index.entries)
+        ]
+        for key, ids in index.keys.items():
+            words = [word for word in (entries[i] for i in ids) if word is not None]
+            self.words[key] = words[0] if len(words) == 1 else words
+        return self
+
+    def add(self, word: Word) -> None:
+        """Map writings and readings to word"""
+        if self.sequences is not None:
+            self.sequences[word.get_sequence_id()] = word
+        for key in word.writings + word.readings:
+            try:
+                entries = self.words[key]
+            except KeyError:
+                self.words[key] = word
+            else:
+                if isinstance(entries, list):
+                    entries.append(word)
+                else:
+                    self.words[key] = [entries, word]
+
+    def get_by_sequence_id(self, sequence_id: int) -> Optional[Word]:
+        """Return the entry with a JMdict ID"""
+        if self.overlay is not None:
+            found = self.overlay.get_by_sequence_id(sequence_id)
+            if found is not None:
+                return found
+        if self.sequences is None:
+            with trace.span('Edict.sequences'):
+                # only set once complete, for the threads searching at the same time
+                sequences = {}
+                if self.index is not None:
+                    # entries of the index are decoded on demand
+                    sequence_ids = {}
+                    for entry_id, entry in enumerate(self.index.entries):
+                        if entry is not None:
+                            entry_sequence_id = parse_sequence_number(entry[2].rsplit('/', 1)[-1])
+                            if entry_sequence_id is not None:
+                                sequence_ids[entry_sequence_id] = entry_id
+                    self.sequence_ids = sequence_ids
+                for entries in self.words.values():
+                    if isinstance(entries, list):
+                        for word in entries:
+                            sequences[word.get_sequence_id()] = word
                     else:
-                        if isinstance(entries, list):
-                            entries.append(word)
-                        else:
-                            self.words[key] = [entries, word]
+                        sequences[entries.get_sequence_id()] = entries
+                self.sequences = sequences
+        found = self.sequences.get(sequence_id)
+        if found is None and self.sequence_ids is not None:
+            indexed_id = self.sequence_ids.get(sequence_id)
+            found = self.get_entry(indexed_id) if indexed_id is not None else None
+        return found
+
+    def entries(self) -> Iterator[Word]:
+        """Iterate through every entry, once each, those of the overlay first"""
+        if self.overlay is None:
+            yield from self.own_entries()
+            return
+        overlay_entries = list(self.overlay.entries())
+        yield from overlay_entries
+        replaced = {word.get_sequence_id() for word in overlay_entries}
+        for word in self.own_entries():
+            if not replaced or word.get_sequence_id() not in replaced:
+                yield word
+
+    def own_entries(self) -> Iterator[Word]:
+        """Iterate through the entries of the dictionary itself, once each"""
+        if self.index is not None:
+            for entry_id, entry in enumerate(self.index.entries):
+                if entry is not None:
+                    # not kept, so that going through the entries does not decode them all for good
+                    yield self.indexed_words[entry_id] or decode_entry(self.index, entry_id)
+        seen: set[int] = set()
+        for entries in self.words.values():
+            for word in entries if isinstance(entries, list) else (entries,):
+                if id(word) not in seen:
+                    seen.add(id(word))
+                    yield word
+
+    def get_entry(self, entry_id: int) -> Word:
+        """Return an entry of the key index"""
+        word = self.indexed_words[entry_id]
+        if word is None:
+            assert self.index is not None
+            # threads decoding the same entry at once keep either copy
+            word = self.indexed_words[entry_id] = decode_entry(self.index, entry_id)
+        return word
 
     def search(self, word: str) -> Iterator[Word]:
-        try:
-            entries = self.words[word]
-        except KeyError:
+        """Iterate through the entries of a writing or reading, those of the overlay first"""
+        overlay = self.overlay
+        if overlay is None:
+            yield from self.own_search(word)
             return
-        else:
-            if isinstance(entries, list):
-                yield from entries
-            else:
-                yield entries
+        yield from overlay.search(word)
+        for entry in self.own_search(word):
+            if overlay.get_by_sequence_id(entry.get_sequence_id()) is None:
+                yield entry
+
+    def own_search(self, word: str) -> Iterator[Word]:
+        """Iterate through the entries of a writing or reading in the dictionary itself"""
+        if self.key_index is not None:
+            for entry_id in self.key_index.get(word):
+                yield self.get_entry(entry_id)
+        entries = self.words.get(word)
+        if isinstance(entries, list):
+            yield from entries
+        elif entries is not None:
+            yield entries
+
+
+class CompressedEdict(Edict):
+    """Dictionary stored in a block-compressed file (see blocks.py)
+
+    Only the keys are loaded (unless a key index is given); entries are
+    decoded when they are looked up. Words added with add() are searched as well.
+    """
+    def __init__(self, filename: str, key_index: Optional[KeyIndex] = None) -> None:
+        super().__init__(None)
+        self.blocks = BlockFile(filename)
+        if key_index is not None and key_index.n_entries != len(self.blocks):
+            key_index = None  # made for other entries
+        self.key_index = key_index
+        self.keys: dict[str, int | list[int]] = {}
+        if key_index is None:
+            self.keys = pickle.loads(self.blocks.metadata())
+
+    def get_entry(self, entry_id: int) -> Word:
+        return self.parse_record(self.blocks[entry_id])
+
+    @staticmethod
+    def parse_record(record: str) -> Word:
+        # facets and collations were added later; they are computed on demand for older files
+        line, type_, furigana, *extra = record.split('\t')
+        word = parse_line(line + '\n')  # like the lines of the source file
+        assert word is not None
+        word._type = int(type_)
+        word._furigana = furigana
+        if extra:
+            word._facets = int(extra[0])
+        if len(extra) > 1:
+            word._collation_record = extra[1]
+        return word
+
+    def get_by_sequence_id(self, sequence_id: int) -> Optional[Word]:
+        word = super().get_by_sequence_id(sequence_id)
+        if word is not None:
+            return word
+        if self.sequence_ids is None:
+            with trace.span('CompressedEdict.sequence_ids'):
+                sequence_ids = {}
+                for entry_id, record in enumerate(self.blocks):
+                    if record:
+                        glosses = record.split('\t', 1)[0].rstrip('/')
+                        entry_sequence_id = parse_sequence_number(glosses.rsplit('/', 1)[-1])
+                        if entry_sequence_id is not None:
+                            sequence_ids[entry_sequence_id] = entry_id
+                self.sequence_ids = sequence_ids
+        record_id = self.sequence_ids.get(sequence_id)
+        return self.get_entry(record_id) if record_id is not None else None
+
+    def own_entries(self) -> Iterator[Word]:
+        """Decode every entry, in order, then iterate through the words added with add()"""
+        for record in self.blocks:
+            if record:
+                yield self.parse_record(record)
+        yield from super().own_entries()
+
+    def own_search(self, word: str) -> Iterator[Word]:
+        ids = self.keys.get(word)
+        if isinstance(ids, int):
+            yield self.get_entry(ids)
+        elif ids is not None:
+            for entry_id in ids:
+                yield self.get_entry(entry_id)
+        yield from super().own_search(word)
+
+
+def is_up_to_date(derived_filename: str, filename: str) -> bool:
+    """Whether a file derived from filename exists and is newer (filename may be missing)"""
+    if not os.path.exists(derived_filename):
+        return False
+    return not os.path.exists(filename) or os.path.getmtime(filename) <= os.path.getmtime(derived_filename)
+
+
+def load_key_index(filename: str, derived_filename: str) -> Optional[KeyIndex]:
+    """Open the key index of a dictionary if it is newer than the file its entries come from"""
+    keys_filename = filename + '.keys'
+    if not is_up_to_date(keys_filename, derived_filename):
+        return None
+    try:
+        return KeyIndex(keys_filename)
+    except ValueError:
+        return None  # written by another version
+
+
+def load(filename: str) -> Edict:
+    """Load a dictionary, from its compiled index or its compressed copy when they are up to date
+
+    With a key index, the compressed copy is used when it has the entries of
+    the compiled index (see update.py), so that entries are only decoded when
+    they are looked up, rather than all loaded in memory with the index.
+    """
+    index_filename = filename + '.idx'
+    blocks_filename = filename + '.blk'
+    # the entries of the other files come from the source, or from the index once updated
+    entries_filename = index_filename if is_up_to_date(index_filename, filename) else filename
+    if is_up_to_date(blocks_filename, entries_filename):
+        key_index = load_key_index(filename, entries_filename)
+        if key_index is not None:
+            return CompressedEdict(blocks_filename, key_index)
+    if is_up_to_date(index_filename, filename):
+        key_index = load_key_index(filename, index_filename)
+        # the keys of the index are only needed without a key index of its entries
+        index = load_index(index_filename, with_keys=key_index is None)
+        if index is not None and key_index is not None and key_index.n_entries != len(index.entries):
+            index, key_index = load_index(index_filename), None
+        # None for an index from another version of the add-on
+        if index is not None:
+            return Edict.from_index(index, key_index)
+    if is_up_to_date(blocks_filename, filename):
+        # the compressed copy is made from the source, like the key index
+        return CompressedEdict(blocks_filename, load_key_index(filename, filename))
+    return Edict(filename)
+
+
+# dictionaries are loaded on first use, by one thread at a time; they are
+# only read afterwards, so they can be searched from several threads
+edict: Optional[Edict] = None
+enamdict: Optional[Edict] = None
+edict_lock = threading.Lock()
+enamdict_lock = threading.Lock()
+# incremented whenever the dictionaries are unloaded or their entries
+# change, so that results computed from the previous ones can be told apart
+version = 0
+
+
+def get_version() -> int:
+    return version
+
+
+def bump_version() -> None:
+    """Drop the results computed so far, e.g. after entries were added to the user dictionary"""
+    global version
+    version += 1
+
+
+def with_user_dictionary(new_edict: Edict) -> Edict:
+    # imported here since userdict.py imports this module
+    from .userdict import get_user_dictionary
+
+    new_edict.overlay = get_user_dictionary()
+    return new_edict
+
+
+def set_edict(new_edict: Edict) -> None:
+    """Replace the loaded EDICT, e.g. with one loaded in the background after an update"""
+    global edict, version
+    edict = with_user_dictionary(new_edict)
+    version += 1
+
+
+def unload() -> None:
+    """Drop the loaded dictionaries (they are loaded again on next use)"""
+    global edict, enamdict, version
+    edict = None
+    enamdict = None
+    version += 1
+
+
+def get_edict() -> Edict:
+    global edict
+    if edict is None:
+        with edict_lock:
+            if edict is None:
+                with trace.span('load edict'):
+                    edict = with_user_dictionary(load(default_edict))
+    return edict
 
 
-edict = Edict(default_edict)
-enamdict = Edict(default_enamdict)
+def get_enamdict() -> Edict:
+    global enamdict
+    if enamdict is None:
+        with enamdict_lock:
+            if enamdict is None:
+                with trace.span('load enamdict'):
+                    enamdict = load(default_enamdict)
+    return enamdict
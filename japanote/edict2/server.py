@@ -0,0 +1,185 @@
+"""Local lookup daemon sharing one copy of the dictionaries between processes
+
+Run from the folder of the add-on:
+
+    python -m edict2.server [--socket PATH]
+
+While it runs, the add-on (and any script using client.py) sends its lookups
+to the daemon instead of loading the dictionaries itself. Requests and
+responses are JSON objects, one per line:
+
+    {"id": 1, "method": "search", "params": {"word": "たべた"}}
+    {"id": 1, "result": [{"line": "食べる [たべる] /(v1,vt) ...", ...}]}
+
+Requests from all connections are queued and processed in batches by a
+single thread; identical requests in a batch are only computed once. The
+loaded dictionaries could be searched from several threads (see
+service.SearchService), but the user dictionary is only reloaded between
+batches, while no search uses it.
+
+The socket is in $XDG_RUNTIME_DIR, or else in a folder of the temporary
+directory that only the user can access; the add-on does not connect to a
+socket that others could have made.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .client import LookupClient, default_socket, word_to_json
+from .furigana import furigana_from_kanji_kana, get_kanjidic
+from .lookup import get_deinflector, lookup
+from .search import get_edict, get_enamdict
+from .userdict import get_user_dictionary
+
+Request = dict[str, Any]
+Response = dict[str, Any]
+
+
+def search(word: str, is_proper_noun: bool = False) -> list[dict[str, Any]]:
+    return [word_to_json(result) for result in lookup(word, is_proper_noun)]
+
+
+def deinflect(word: str) -> list[tuple[str, int]]:
+    return [(candidate.word, candidate.type_) for candidate in get_deinflector()(word)]
+
+
+methods: dict[str, Callable[..., Any]] = {
+    'search': search,
+    'deinflect': deinflect,
+    'furigana': furigana_from_kanji_kana,
+}
+
+
+def is_request(request: Any) -> bool:
+    return (
+        isinstance(request, dict) and isinstance(request.get('method'), str)
+        and isinstance(request.get('params', {}), dict)
+    )
+
+
+def process_request(request: Request) -> Response:
+    try:
+        method = methods[request['method']]
+    except KeyError:
+        return {'error': f'unknown method {request["method"]}'}
+    try:
+        return {'result': method(**request.get('params', {}))}
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}
+    except (OSError, KeyError) as e:
+        # e.g. a dictionary that cannot be read: answered like the others, so that the daemon keeps serving
+        return {'error': f'internal error: {e!r}'}
+
+
+def process_batch(requests: list[Request]) -> list[Response]:
+    # entries added to the user dictionary by the add-on since the last batch
+    get_user_dictionary().reload_if_changed()
+    responses: dict[str, Response] = {}
+    keys = [json.dumps([request['method'], request.get('params')], sort_keys=True) for request in requests]
+    for key, request in zip(keys, requests):
+        if key not in responses:
+            responses[key] = process_request(request)
+    return [responses[key] for key in keys]
+
+
+class LookupServer:
+    def __init__(self, max_batch: int = 64) -> None:
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue: asyncio.Queue[tuple[Request, asyncio.Future[Response]]] = asyncio.Queue()
+
+    @staticmethod
+    def respond(writer: asyncio.StreamWriter, request_id: Any, future: 'asyncio.Future[Response]') -> None:
+        if not writer.is_closing():
+            writer.write(json.dumps({'id': request_id, **future.result()}).encode() + b'\n')
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            async for line in reader:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    writer.write(b'{"id": null, "error": "invalid JSON"}\n')
+                    continue
+                if not is_request(request):
+                    request_id = request.get('id') if isinstance(request, dict) else None
+                    error = {'id': request_id, 'error': 'expected {"method": ..., "params": {...}}'}
+                    writer.write(json.dumps(error).encode() + b'\n')
+                    continue
+                future: asyncio.Future[Response] = loop.create_future()
+                future.add_done_callback(functools.partial(self.respond, writer, request.get('id')))
+                await self.queue.put((request, future))
+        finally:
+            writer.close()
+
+    async def process_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            requests = [request for request, _ in batch]
+            try:
+                responses = await loop.run_in_executor(self.executor, process_batch, requests)
+            except (OSError, ValueError) as e:
+                # the user dictionary could not be read or parsed; the next batch may succeed
+                responses = [{'error': f'internal error: {e!r}'}] * len(batch)
+            for (_, future), response in zip(batch, responses):
+                future.set_result(response)
+
+
+async def serve(path: str, max_batch: int) -> None:
+    server = LookupServer(max_batch)
+    unix_server = await asyncio.start_unix_server(server.handle_connection, path)
+    os.chmod(path, 0o600)
+    task = asyncio.gather(unix_server.serve_forever(), server.process_batches())
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        unix_server.close()
+        os.unlink(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve dictionary lookups on a Unix domain socket')
+    parser.add_argument('--socket', default=default_socket, help=f'socket path (default: {default_socket})')
+    parser.add_argument('--max-batch', type=int, default=64, help='maximum number of requests per batch')
+    args = parser.parse_args()
+
+    if args.socket == default_socket:
+        os.makedirs(os.path.dirname(args.socket), mode=0o700, exist_ok=True)
+        folder = os.lstat(os.path.dirname(args.socket))
+        if folder.st_uid != os.getuid() or folder.st_mode & 0o077:
+            sys.exit(f'{os.path.dirname(args.socket)} must only be accessible by you')
+
+    if os.path.exists(args.socket):
+        try:
+            LookupClient(args.socket).close()
+        except OSError:
+            os.unlink(args.socket)  # left over by a daemon that did not exit cleanly
+        else:
+            sys.exit(f'a lookup daemon is already listening on {args.socket}')
+
+    # load everything before accepting connections
+    get_edict()
+    get_enamdict()
+    get_deinflector()
+    get_kanjidic()
+
+    asyncio.run(serve(args.socket, args.max_batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import time
+from contextlib import AbstractContextManager
+
+# tracing is disabled by default; span() then returns a shared no-op context
+# manager so that instrumented code only pays for a function call
+enabled = False
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+class _Timer:
+    __slots__ = ('start', 'stats')
+
+    def __init__(self, stats: Stats) -> None:
+        self.stats = stats
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stats.add(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+_null_timer = _NullTimer()
+spans: dict[str, Stats] = {}
+counters: dict[str, int] = {}
+
+
+def span(name: str) -> AbstractContextManager[None]:
+    """Time the enclosed block under `name` when tracing is enabled"""
+    if not enabled:
+        return _null_timer
+    try:
+        stats = spans[name]
+    except KeyError:
+        stats = spans[name] = Stats()
+    return _Timer(stats)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name` when tracing is enabled"""
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def reset() -> None:
+    spans.clear()
+    counters.clear()
+
+
+def report() -> str:
+    """Return a plain text table of recorded spans and counters"""
+    if not spans and not counters:
+        return 'Nothing recorded'
+    lines = [f'{"span":32} {"count":>8} {"total (ms)":>12} {"mean (ms)":>12} {"max (ms)":>12}']
+    for name, stats in sorted(spans.items(), key=lambda item: -item[1].total):
+        mean = stats.total / stats.count
+        lines.append(f'{name:32} {stats.count:8} {stats.total * 1e3:12.3f} {mean * 1e3:12.3f} {stats.max * 1e3:12.3f}')
+    if counters:
+        lines.append('')
+        lines.append(f'{"counter":32} {"value":>8}')
+        lines.extend(f'{name:32} {value:8}' for name, value in sorted(counters.items()))
+    return '\n'.join(lines)
+
+
+def write_report(filename: str) -> None:
+    """Append the current report to a log file"""
+    with open(filename, 'a') as f:
+        f.write(time.strftime('# %Y-%m-%d %H:%M:%S\n'))
+        f.write(report() + '\n\n')
@@ -0,0 +1,213 @@
+"""Update a compiled dictionary index with the differences between two releases
+
+Run from the folder of the add-on:
+
+    python -m edict2.update diff old/edict2 new/edict2 -o edict2.diff
+    python -m edict2.update apply edict2/edict2.idx edict2.diff
+
+A diff lists the entries to add or replace, as EDICT2 lines prefixed with
+'+', and the sequence numbers of the entries to remove, prefixed with '-':
+
+    -EntL1000010X
+    +食べる [たべる] /(v1,vt) to eat/EntL1358280X/
+
+Entries are matched by sequence number. Only the postings and derived data
+(type masks, furigana, facets, collations) of affected entries are updated;
+the slots of removed entries are left empty until the index is rebuilt. The
+key index and the compressed copy next to the compiled index, if any, are
+written again.
+"""
+import argparse
+import bisect
+import contextlib
+import os
+import sys
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+from .blocks import pack_dictionary
+from .build import build, index_words, word_pattern
+from .index import DictionaryIndex, load_index, save_index
+from .keyindex import write_key_index
+from .search import CompressedEdict, Word, encode_collation, parse_line, parse_sequence_number
+
+diff_header = '# JapaNote dictionary update\n'
+
+
+def read_entries(filename: str) -> dict[int, str]:
+    """Map the sequence numbers of a dictionary (EDICT2 or JMdict XML) to its lines"""
+    if filename.endswith('.xml'):
+        from .jmdict import iter_words
+
+        words: Iterable[Optional[Word]] = iter_words(filename)
+    else:
+        with open(filename, encoding='utf-8') as f:
+            next(f)  # skip header
+            words = [parse_line(line) for line in f]
+    return {word.get_sequence_id(): word.edict_entry for word in words if word is not None}
+
+
+def make_diff(old_filename: str, new_filename: str) -> Iterator[str]:
+    """Iterate through the lines of the diff from one release to the next"""
+    old = read_entries(old_filename)
+    new = read_entries(new_filename)
+    yield diff_header
+    for sequence_id in old.keys() - new.keys():
+        yield f'-EntL{sequence_id}\n'
+    for sequence_id, line in new.items():
+        if old.get(sequence_id) != line:
+            yield '+' + line
+
+
+def terms(word: Word) -> list[str]:
+    return sorted(set(word_pattern.findall(' '.join(word.get_meanings()).lower())))
+
+
+def remove_entry(index: DictionaryIndex, entry_id: int) -> None:
+    entry = index.entries[entry_id]
+    if entry is None:
+        return
+    word = Word(*entry)
+    for postings, keys in ((index.keys, word.writings + word.readings), (index.glosses, terms(word))):
+        for key in keys:
+            ids = postings.get(key)
+            if ids is None:
+                continue
+            i = bisect.bisect_left(ids, entry_id)
+            if i < len(ids) and ids[i] == entry_id:
+                del ids[i]
+            if not ids:
+                del postings[key]
+    index.entries[entry_id] = None
+
+
+def set_entry(index: DictionaryIndex, entry_id: int, word: Word) -> None:
+    """Store word in a slot (new or emptied by remove_entry) and index it"""
+    entry = (word.writings, word.readings, word.glosses, word.edict_entry)
+    if entry_id == len(index.entries):
+        index.entries.append(entry)
+        index.types.append(word.get_type())
+        index.furigana.append(word.get_furigana())
+        index.facets.append(word.get_facets())
+        index.collation.append(encode_collation(word.get_collation()))
+    else:
+        index.entries[entry_id] = entry
+        index.types[entry_id] = word.get_type()
+        index.furigana[entry_id] = word.get_furigana()
+        index.facets[entry_id] = word.get_facets()
+        index.collation[entry_id] = encode_collation(word.get_collation())
+    # keep postings sorted, like a full build would
+    for postings, keys in ((index.keys, word.writings + word.readings), (index.glosses, terms(word))):
+        for key in dict.fromkeys(keys):
+            bisect.insort(postings.setdefault(key, []), entry_id)
+
+
+def apply_diff(index: DictionaryIndex, lines: Iterable[str]) -> tuple[int, int, int]:
+    """Update index in place and return the numbers of entries added, changed and removed
+
+    Raises ValueError for a line that is not a comment, a sequence number to
+    remove or an entry with a sequence number to add (the index is then
+    partly updated, and should not be saved).
+    """
+    entry_ids = {}
+    for entry_id, entry in enumerate(index.entries):
+        if entry is not None:
+            sequence_id = parse_sequence_number(entry[2].rsplit('/', 1)[-1])
+            if sequence_id is not None:
+                entry_ids[sequence_id] = entry_id
+
+    added = changed = removed = 0
+    for line_number, line in enumerate(lines, 1):
+        if line.startswith('-'):
+            sequence_id = parse_sequence_number(line[1:])
+            if sequence_id is None:
+                msg = f'line {line_number}: not a sequence number: {line.strip()}'
+                raise ValueError(msg)
+            if sequence_id not in entry_ids:
+                continue
+            remove_entry(index, entry_ids.pop(sequence_id))
+            removed += 1
+        elif line.startswith('+'):
+            word = parse_line(line[1:])
+            sequence_number = word.get_sequence_number() if word is not None else None
+            sequence_id = parse_sequence_number(sequence_number) if sequence_number is not None else None
+            if word is None or sequence_id is None:
+                msg = f'line {line_number}: not an entry with a sequence number: {line.strip()}'
+                raise ValueError(msg)
+            if sequence_id in entry_ids:
+                entry_id = entry_ids[sequence_id]
+                remove_entry(index, entry_id)
+                changed += 1
+            else:
+                entry_id = entry_ids[sequence_id] = len(index.entries)
+                added += 1
+            set_entry(index, entry_id, word)
+        elif line.strip() and not line.startswith('#'):
+            msg = f'line {line_number}: not a line of a dictionary update: {line.strip()}'
+            raise ValueError(msg)
+    return added, changed, removed
+
+
+def save_updated_index(index: DictionaryIndex, index_filename: str) -> None:
+    save_index(index, index_filename)
+    keys_filename = os.path.splitext(index_filename)[0] + '.keys'
+    if os.path.exists(keys_filename):
+        # when it cannot be replaced (e.g. still mapped on Windows), it is older
+        # than the index, so it is not used anymore
+        with contextlib.suppress(OSError):
+            write_key_index(index.keys, len(index.entries), keys_filename)
+    blocks_filename = os.path.splitext(index_filename)[0] + '.blk'
+    if os.path.exists(blocks_filename):
+        # replaced rather than overwritten, since it may be mapped (see blocks.py)
+        with contextlib.suppress(OSError):
+            pack_dictionary(index, blocks_filename + '.tmp')
+            os.replace(blocks_filename + '.tmp', blocks_filename)
+
+
+def update_dictionary(filename: str, diff_filename: str) -> tuple[int, int, int]:
+    """Apply a diff to the compiled index of a dictionary (built first if needed)"""
+    index_filename = filename + '.idx'
+    index = None
+    # same rules as search.load() to decide whether the index is up to date
+    if os.path.exists(index_filename) and (
+        not os.path.exists(filename) or os.path.getmtime(filename) <= os.path.getmtime(index_filename)
+    ):
+        index = load_index(index_filename)
+    if index is None and not os.path.exists(filename) and os.path.exists(filename + '.blk'):
+        # only the compressed copy is shipped with the add-on
+        index = index_words(CompressedEdict(filename + '.blk').entries())
+    if index is None:
+        index = build(filename, processes=1)
+    with open(diff_filename, encoding='utf-8') as f:
+        counts = apply_diff(index, f)
+    save_updated_index(index, index_filename)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Update compiled dictionary indexes incrementally')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    diff_parser = subparsers.add_parser('diff', help='compute the diff between two releases')
+    diff_parser.add_argument('old', help='previous release (EDICT2 or JMdict XML)')
+    diff_parser.add_argument('new', help='new release (EDICT2 or JMdict XML)')
+    diff_parser.add_argument('-o', '--output', help='diff file (default: standard output)')
+    apply_parser = subparsers.add_parser('apply', help='apply a diff to a compiled index')
+    apply_parser.add_argument('index', help='index file (e.g. edict2/edict2.idx)')
+    apply_parser.add_argument('diff', help='diff file')
+    args = parser.parse_args()
+
+    if args.command == 'diff':
+        with open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout as f:
+            f.writelines(make_diff(args.old, args.new))
+    else:
+        index = load_index(args.index)
+        if index is None:
+            sys.exit(f'{args.index} was built by another version; rebuild it first')
+        with open(args.diff, encoding='utf-8') as f:
+            added, changed, removed = apply_diff(index, f)
+        save_updated_index(index, args.index)
+        print(f'{added} entries added, {changed} changed, {removed} removed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Entries added by the user, searched along with EDICT
+
+The user dictionary is a small file in EDICT2 format (user_files/userdict,
+which Anki keeps when the add-on is updated). It is loaded on its own and
+attached to EDICT once loaded (see Edict.overlay), so that its entries are
+found by every search without changing the files of EDICT or reloading it.
+An entry with the JMdict ID of an entry of EDICT replaces it, e.g. to
+correct it.
+
+Adding or removing an entry only changes the keys of that entry, appends
+to the file or rewrites it (it is small), and changes the version of the
+dictionaries so that results cached before are dropped. Entries without a
+JMdict ID are given one above those of JMdict and ENAMDICT, so that their
+notes can be found again (see the ID field).
+"""
+import os
+import threading
+from collections.abc import Iterator
+from typing import Optional
+
+from .search import Edict, Word, bump_version, parse_line
+
+# in the folder of the add-on, next to this package
+addon_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_user_dictionary = os.path.join(addon_folder, 'user_files', 'userdict')
+# JMdict IDs of the entries added without one
+first_user_sequence_id = 9000000
+header = '　？？？ /JapaNote user dictionary/\n'
+
+
+class UserDictionary(Edict):
+    """Entries of a file in EDICT2 format that can be added and removed one at a time
+
+    The entries of a key are replaced rather than changed in place, so that
+    other threads can search while entries are added or removed.
+    """
+    def __init__(self, filename: str = default_user_dictionary) -> None:
+        super().__init__(None)
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.sequences = {}
+        # of the file when last read or written, to notice changes made by other processes
+        self.signature: Optional[tuple[int, int]] = None
+        self.reload()
+
+    def file_signature(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> None:
+        """Read the file again (no entries if it does not exist)"""
+        # mapped apart, then swapped, for the threads searching the current entries
+        loaded = Edict(None)
+        loaded.sequences = {}
+        with self.lock:
+            signature = self.file_signature()
+            if signature is not None:
+                with open(self.filename, encoding='utf-8') as f:
+                    lines = iter(f)
+                    next(lines, None)  # skip header
+                    for line in lines:
+                        word = parse_line(line.rstrip('\n') + '\n')
+                        if word is not None:
+                            loaded.add(word)
+            self.words, self.sequences, self.signature = loaded.words, loaded.sequences, signature
+
+    def reload_if_changed(self) -> bool:
+        """Read the file again if another process changed it; return whether it did"""
+        if self.file_signature() == self.signature:
+            return False
+        self.reload()
+        bump_version()
+        return True
+
+    def add(self, word: Word) -> None:
+        """Map writings and readings to word"""
+        assert self.sequences is not None
+        self.sequences[word.get_sequence_id()] = word
+        for key in dict.fromkeys(word.writings + word.readings):
+            entries = self.words.get(key)
+            if entries is None:
+                self.words[key] = word
+            else:
+                self.words[key] = [*(entries if isinstance(entries, list) else [entries]), word]
+
+    def discard(self, word: Word) -> None:
+        """Unmap the writings and readings of word"""
+        assert self.sequences is not None
+        del self.sequences[word.get_sequence_id()]
+        for key in dict.fromkeys(word.writings + word.readings):
+            entries = self.words.get(key)
+            if entries is None:
+                continue
+            others = [entry for entry in (entries if isinstance(entries, list) else [entries]) if entry is not word]
+            if not others:
+                del self.words[key]
+            else:
+                self.words[key] = others if len(others) > 1 else others[0]
+
+    def get_by_sequence_id(self, sequence_id: int) -> Optional[Word]:
+        assert self.sequences is not None
+        return self.sequences.get(sequence_id)
+
+    def own_entries(self) -> Iterator[Word]:
+        """Iterate through the entries, in the order of the file"""
+        assert self.sequences is not None
+        yield from list(self.sequences.values())
+
+    def lines(self) -> list[str]:
+        """Return the entries in EDICT2 format"""
+        return [word.edict_entry.rstrip('\n') for word in self.entries()]
+
+    def add_line(self, line: str) -> Word:
+        """Add an entry in EDICT2 format (given a JMdict ID if it has none) and save it
+
+        Raises ValueError if line is not an entry or has the ID of another entry.
+        """
+        line = line.strip()
+        word = parse_line(line + '\n')
+        if word is None:
+            msg = f'not an entry in EDICT2 format: {line}'
+            raise ValueError(msg)
+        with self.lock:
+            assert self.sequences is not None
+            if not word.glosses.split('/')[-1].startswith('EntL'):
+                sequence_id = max([first_user_sequence_id - 1, *self.sequences]) + 1
+                word = parse_line(f'{line}EntL{sequence_id}X/\n')
+                assert word is not None
+            if word.get_sequence_id() in self.sequences:
+                msg = f'{word.get_sequence_number()} is already in the user dictionary'
+                raise ValueError(msg)
+            self.add(word)
+            is_new = not os.path.exists(self.filename)
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(self.filename, 'a', encoding='utf-8') as f:
+                f.write((header if is_new else '') + word.edict_entry)
+            self.signature = self.file_signature()
+        bump_version()
+        return word
+
+    def remove(self, sequence_id: int) -> Optional[Word]:
+        """Remove the entry with a JMdict ID and save the others; return it (None if there is none)"""
+        with self.lock:
+            word = self.get_by_sequence_id(sequence_id)
+            if word is None:
+                return None
+            self.discard(word)
+            temporary_filename = self.filename + '.tmp'
+            with open(temporary_filename, 'w', encoding='utf-8') as f:
+                f.write(header)
+                f.writelines(entry.edict_entry for entry in self.entries())
+            os.replace(temporary_filename, self.filename)
+            self.signature = self.file_signature()
+        bump_version()
+        return word
+
+
+# loaded on first use, with EDICT
+user_dictionary: Optional[UserDictionary] = None
+user_dictionary_lock = threading.Lock()
+
+
+def get_user_dictionary() -> UserDictionary:
+    global user_dictionary
+    if user_dictionary is None:
+        with user_dictionary_lock:
+            if user_dictionary is None:
+                user_dictionary = UserDictionary()
+    return user_dictionary
@@ -1,17 +1,25 @@
+import html
+import itertools
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future
 from gettext import ngettext
-from typing import Iterable, Optional
+from typing import Callable, Optional
 
+from anki.collection import AddNoteRequest
+from anki.decks import DeckId
 from anki.models import NotetypeDict
 from anki.notes import Note
-from aqt import Collection, mw
+from aqt import mw
 from aqt.qt import QAbstractTableModel, Qt
 from aqt.utils import showInfo, tooltip
 
-from . import romkan
 from .collection import get_collection
-from .edict2.deinflect import Deinflector
-from .edict2.search import Word, edict, enamdict
+from .edict2 import trace
+from .edict2.examples import get_examples
+from .edict2.prepare import prepare_words
+from .edict2.search import Word
 from .qt import QtCore
+from .service import SearchResult
 from .settingswindow import SettingsWindow
 
 
@@ -30,7 +38,7 @@ def check_field(model: NotetypeDict, config_key: str) -> bool:
     return False
 
 
-def note_set_field(note: Note, config_key: str, value: str) -> None:
+def note_set_field(note: Note, config_key: str, value: Optional[str]) -> None:
     col = get_collection()
     try:
         model_field = col.conf[config_key]
@@ -48,12 +56,108 @@ def note_set_field(note: Note, config_key: str, value: str) -> None:
             showInfo(f'Note type "{model["name"]}" has no field "{model_field}"')
 
 
-def add_notes(words: Iterable[Word]) -> None:
+# example sentences put in the example field of a note
+note_examples = 2
+
+
+def get_examples_html(word: Word, limit: int = note_examples) -> str:
+    """Return example sentences of word, each followed by its translation (empty without a corpus)"""
+    examples = get_examples()
+    if examples is None:
+        return ''
+    return '<br>'.join(
+        f'{html.escape(example.japanese)}<br>{html.escape(example.english)}'
+        for example in examples.for_word(word, limit)
+    )
+
+
+def fill_note(note: Note, word: Word) -> None:
+    note_set_field(note, 'japanote_kanjiField', word.kanji)
+    note_set_field(note, 'japanote_kanaField', word.kana)
+    note_set_field(note, 'japanote_furiganaField', word.get_furigana())
+    note_set_field(note, 'japanote_definitionField', word.get_meanings_html())
+    # names of ENAMDICT have no ID; the field is left empty
+    note_set_field(note, 'japanote_idField', word.get_sequence_number())
+    # optional, since looking for examples costs a lookup
+    if get_collection().conf.get('japanote_exampleField'):
+        note_set_field(note, 'japanote_exampleField', get_examples_html(word))
+
+
+def find_existing_ids(idfield: str, words: list[Word]) -> set[str]:
+    """Return the JMdict IDs of words that already have a note (words without one are left out)"""
+    sequence_numbers = [word.get_sequence_number() for word in words]
+    if not any(sequence_numbers):
+        return set()
+    col = get_collection()
+    query = ' OR '.join(f'"{idfield}:{number}"' for number in sequence_numbers if number is not None)
+    with trace.span('find_notes'):
+        note_ids = col.find_notes(query)
+    return {col.get_note(note_id)[idfield] for note_id in note_ids}
+
+
+# words prepared in the background rather than while the user waits
+background_words = 50
+
+
+def add_notes(words: Iterable[Word], on_done: Optional[Callable[[int], None]] = None) -> None:
+    """Create notes for words, then call on_done with the number of cards added
+
+    The furigana and definitions of the words are computed first (see
+    edict2/prepare.py), in the background when there are many words, so that
+    creating the notes only writes to the collection.
+    """
+    def done(n_cards: int) -> None:
+        if on_done is not None:
+            on_done(n_cards)
+
+    target = check_settings()
+    if target is None:
+        done(0)
+        return
+    model, deck_id = target
+
+    # skip words that already have a note (when their id is saved; names have none)
+    col = get_collection()
+    idfield = col.conf.get('japanote_idField')
+    selected = list(words)
+    existing = find_existing_ids(idfield, selected) if idfield else set()
+    new_words = []
+    for word in selected:
+        sequence_number = word.get_sequence_number()
+        if idfield and sequence_number is not None:
+            if sequence_number in existing:
+                continue
+            existing.add(sequence_number)
+        new_words.append(word)
+
+    if len(new_words) < background_words:
+        prepare_words(new_words)
+        done(create_notes(new_words, model, deck_id))
+        return
+
+    def on_prepared(future: Future[None]) -> None:
+        try:
+            future.result()  # raises the error of preparing the words
+            n_cards = create_notes(new_words, model, deck_id)
+        except Exception:
+            done(0)  # not left waiting (e.g. the HTTP API)
+            raise
+        done(n_cards)
+
+    # in one background thread: the workers of a process pool would import the add-on, which needs Anki's GUI
+    assert mw is not None
+    mw.taskman.with_progress(
+        lambda: prepare_words(new_words), on_prepared, label=f'Preparing {len(new_words)} notes',
+    )
+
+
+def check_settings() -> Optional[tuple[NotetypeDict, DeckId]]:
+    """Return the note type and the deck of new notes, or None after telling the user what is missing"""
     col = get_collection()
     if not col.conf.get('japanote_hasopensettings'):
         showInfo('Please check the settings first')
         SettingsWindow.open()
-        return
+        return None
 
     # select deck
     deck_name = col.conf.get('japanote_deck')
@@ -64,60 +168,65 @@ def add_notes(words: Iterable[Word]) -> None:
     deck = col.decks.get(deck_id)
     if deck is None:
         showInfo('Deck not found')
-        return
+        return None
 
     # select model
     try:
         model_name = col.conf['japanote_model']
     except KeyError:
         showInfo('Note type is not set')
-        return
+        return None
     model = col.models.by_name(model_name)
     if model is None:
         showInfo('Note type not found')
-        return
+        return None
     model['did'] = deck['id']  # update model's default deck
 
     # check fields
-    if not check_field(model, 'japanote_kanjiField'):
-        return
-    if not check_field(model, 'japanote_kanaField'):
-        return
-    if not check_field(model, 'japanote_furiganaField'):
-        return
-    if not check_field(model, 'japanote_definitionField'):
-        return
-    if not check_field(model, 'japanote_idField'):
-        return
+    fields = (
+        'japanote_kanjiField', 'japanote_kanaField', 'japanote_furiganaField', 'japanote_definitionField',
+        'japanote_idField', 'japanote_exampleField',
+    )
+    if not all(check_field(model, config_key) for config_key in fields):
+        return None
+    return model, DeckId(deck['id'])
+
 
-    n_newcards = 0
-    for word in words:
-        # create new note
-        note = Note(col, model)
-        # fill new note
-        note_set_field(note, 'japanote_kanjiField', word.kanji)
-        note_set_field(note, 'japanote_kanaField', word.kana)
-        note_set_field(note, 'japanote_furiganaField', word.get_furigana())
-        note_set_field(note, 'japanote_definitionField', word.get_meanings_html())
-        note_set_field(note, 'japanote_idField', word.get_sequence_number())
-
-        # check for duplicates if id field is set
-        idfield = col.conf.get('japanote_idField')
-        if idfield and col.find_notes(f'{idfield}:{word.get_sequence_number()}'):
-            continue
-
-        # add card
-        n_newcards += col.addNote(note)
+def create_notes(words: list[Word], model: NotetypeDict, deck_id: DeckId) -> int:
+    """Add the notes of prepared words and return the number of cards added"""
+    col = get_collection()
+    with trace.span('add_notes'):
+        requests = []
+        for word in words:
+            note = Note(col, model)
+            fill_note(note, word)
+            requests.append(AddNoteRequest(note, deck_id=deck_id))
+
+        # add all the notes at once
+        n_cards = col.card_count()
+        if requests:
+            with trace.span('col.add_notes'):
+                col.add_notes(requests)
+        n_newcards: int = col.card_count() - n_cards
     assert mw is not None
     mw.reset()
     tooltip(ngettext('{} card added.', '{} cards added.', n_newcards).format(n_newcards))
+    return n_newcards
 
 
 class WordSearchModel(QAbstractTableModel):
+    """Table of the words of a search result (see service.py)"""
+    # number of rows inserted at once when the view needs more results
+    batch_size = 256
+
     def __init__(self) -> None:
         QAbstractTableModel.__init__(self)
+        self.result: Optional[SearchResult] = None
         self.words: list[Word] = []
-        self.is_proper_noun = False
+        # rendered column strings, filled on first display of each row
+        self.rows: list[Optional[list[str]]] = []
+        # results not fetched yet; None when exhausted
+        self.results: Optional[Iterator[Word]] = None
 
     def rowCount(self, parent: QtCore.QModelIndex = ...) -> int:
         return len(self.words)
@@ -141,48 +250,75 @@ class WordSearchModel(QAbstractTableModel):
             return None
         if role == Qt.ItemDataRole.DisplayRole:
             row: int = index.row()
-            word = self.words[row]
-            column = index.column()
-            if column == 0:
-                return word.kanji
-            elif column == 1:
-                return word.kana
-            elif column == 2:
-                return word.get_furigana()
-            elif column == 3:
-                return word.get_sequence_number()
-            elif column == 4:
-                return '\n'.join(word.get_meanings())
-            else:
-                raise NotImplementedError
+            rendered = self.rows[row]
+            if rendered is None:
+                rendered = self.rows[row] = self.render(self.words[row])
+            return rendered[index.column()]
         else:
             return None
 
-    def sort(self, column: int, order: Qt.SortOrder = QtCore.Qt.SortOrder.DescendingOrder) -> None:
-        reverse = order == QtCore.Qt.SortOrder.DescendingOrder
-        if column == 0:
-            key = lambda word: word.kanji
-        elif column == 1:
-            key = lambda word: word.kana
-        else:
+    def render(self, word: Word) -> list[str]:
+        with trace.span('WordSearchModel.render'):
+            return [
+                word.kanji,
+                word.kana,
+                word.get_furigana(),
+                word.get_sequence_number() or '',
+                '\n'.join(word.get_meanings()),
+            ]
+
+    def canFetchMore(self, _parent: QtCore.QModelIndex) -> bool:
+        return self.results is not None
+
+    def fetchMore(self, _parent: QtCore.QModelIndex) -> None:
+        self.fetch(self.batch_size)
+
+    def fetch(self, count: Optional[int] = None) -> None:
+        """Fetch up to count more results (all of them if count is None)"""
+        if self.results is None:
             return
-        self.modelAboutToBeReset.emit()
-        self.words = sorted(self.words, key=key, reverse=reverse)
-        self.modelReset.emit()
-
-    def search(self, word: str) -> None:
-        word = romkan.to_hiragana(word)
-        self.modelAboutToBeReset.emit()
-        if self.is_proper_noun:
-            self.words = list(enamdict.search(word))
-        else:
-            self.words = []
-            for candidate in set(deinflector(word)):
-                for word2 in edict.search(candidate.word):
-                    if word2.get_type() & candidate.type_:
-                        self.words.append(word2)
-        self.modelReset.emit()
+        with trace.span('WordSearchModel.fetch'):
+            words = list(itertools.islice(self.results, count))
+        if count is None or len(words) < count:
+            self.results = None
+        if not words:
+            return
+        trace.count('search results', len(words))
+        first = len(self.words)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(words) - 1)
+        self.words.extend(words)
+        self.rows.extend(None for _ in words)
+        self.endInsertRows()
 
+    def sort(self, column: int, order: Qt.SortOrder = QtCore.Qt.SortOrder.DescendingOrder) -> None:
+        reverse = order == QtCore.Qt.SortOrder.DescendingOrder
+        self.fetch()
+        self.layoutAboutToBeChanged.emit()
+        with trace.span('WordSearchModel.sort'):
+            # keys are decoded from the index (or computed) once per word and reused by later sorts
+            keys = [word.get_collation()[column] for word in self.words]
+            permutation = sorted(range(len(self.words)), key=keys.__getitem__, reverse=reverse)
+            self.words = [self.words[i] for i in permutation]
+            self.rows = [self.rows[i] for i in permutation]
+            # the selection and the current index follow their words
+            new_row = [0] * len(permutation)
+            for row, old_row in enumerate(permutation):
+                new_row[old_row] = row
+            old_indexes = self.persistentIndexList()
+            new_indexes = [
+                self.index(new_row[index.row()], index.column()) if index.isValid() else index
+                for index in old_indexes
+            ]
+            self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
 
-deinflector = Deinflector()
-word_search = WordSearchModel()
+    def show(self, result: SearchResult) -> None:
+        """Display the words of a result"""
+        with trace.span('WordSearchModel.show'):
+            self.modelAboutToBeReset.emit()
+            self.result = result
+            self.words = []
+            self.rows = []
+            self.results = iter(result.words)
+            self.modelReset.emit()
+            self.fetch(self.batch_size)
@@ -1,9 +1,15 @@
+from importlib import import_module
+from types import ModuleType
+
 try:
     from PyQt5 import QtCore, QtGui
 except ImportError:
-    from PyQt6 import QtCore, QtGui  # type: ignore[import-not-found, no-redef]
-    from . import searchwindow_qt6 as searchwindow
-    from . import settingswindow_qt6 as settingswindow
+    from PyQt6 import QtCore, QtGui  # type: ignore[no-redef]
+    qt_major = 6
 else:
-    from . import searchwindow_qt5 as searchwindow  # type: ignore[no-redef]
-    from . import settingswindow_qt5 as settingswindow  # type: ignore[no-redef]
+    qt_major = 5
+
+
+def load_form(name: str) -> ModuleType:
+    """Import the module generated from `name`.ui for the running Qt version"""
+    return import_module(f'.{name}_qt{qt_major}', __package__)
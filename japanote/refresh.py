@@ -0,0 +1,79 @@
+import functools
+from gettext import ngettext
+
+from anki.collection import Collection, OpChangesWithCount
+from aqt import mw
+from aqt.operations import CollectionOp
+from aqt.utils import showInfo, tooltip
+
+from .edict2 import trace
+from .edict2.search import get_edict, parse_sequence_number
+from .model import check_field, fill_note
+
+# number of notes written (and read between progress updates) at once
+batch_size = 500
+
+
+def refresh_notes() -> None:
+    """Update the fields of the notes created by JapaNote from the current dictionary"""
+    assert mw is not None
+    col = mw.col
+    assert col is not None
+    idfield = col.conf.get('japanote_idField')
+    if not idfield:
+        showInfo('Notes can only be refreshed when the JMdict ID is saved in a field')
+        return
+    model_name = col.conf.get('japanote_model')
+    model = col.models.by_name(model_name) if model_name else None
+    if model is None:
+        showInfo('Note type not found')
+        return
+    fields = (
+        'japanote_kanjiField', 'japanote_kanaField', 'japanote_furiganaField', 'japanote_definitionField',
+        'japanote_exampleField',
+    )
+    if not all(check_field(model, config_key) for config_key in fields):
+        return
+
+    def on_success(changes: OpChangesWithCount) -> None:
+        tooltip(ngettext('{} note updated.', '{} notes updated.', changes.count).format(changes.count))
+
+    query = f'"note:{model_name}" "{idfield}:EntL*"'
+    op = CollectionOp(parent=mw, op=lambda col: update_notes(col, query, idfield))
+    op.success(on_success).run_in_background()
+
+
+def update_notes(col: Collection, query: str, idfield: str) -> OpChangesWithCount:
+    """Refresh the notes matching query, in a background thread"""
+    assert mw is not None
+    note_ids = col.find_notes(query)
+    edict = get_edict()
+    undo_entry = col.add_custom_undo_entry('Refresh JapaNote notes')
+
+    n_updated = 0
+    changed = []
+    for i, note_id in enumerate(note_ids):
+        if i % batch_size == 0:
+            label = f'Refreshing notes ({i}/{len(note_ids)})'
+            mw.taskman.run_on_main(functools.partial(mw.progress.update, label=label, value=i, max=len(note_ids)))
+        note = col.get_note(note_id)
+        sequence_id = parse_sequence_number(note[idfield])
+        word = edict.get_by_sequence_id(sequence_id) if sequence_id is not None else None
+        if word is None:
+            continue  # not in the dictionary anymore
+        fields = list(note.fields)
+        fill_note(note, word)
+        if note.fields == fields:
+            continue
+        changed.append(note)
+        if len(changed) == batch_size:
+            with trace.span('col.update_notes'):
+                col.update_notes(changed)
+            n_updated += len(changed)
+            changed = []
+    if changed:
+        with trace.span('col.update_notes'):
+            col.update_notes(changed)
+        n_updated += len(changed)
+
+    return OpChangesWithCount(count=n_updated, changes=col.merge_undo_entries(undo_entry))
@@ -0,0 +1,13 @@
+# types of the vendored romkan.py, which mypy does not check
+import re
+
+def normalize_double_n(str: str) -> str: ...
+def to_katakana(str: str) -> str: ...
+def to_hiragana(str: str) -> str: ...
+def to_kana(str: str) -> str: ...
+def to_hepburn(str: str) -> str: ...
+def to_kunrei(str: str) -> str: ...
+def to_roma(str: str) -> str: ...
+def is_consonant(str: str) -> re.Match[str] | None: ...
+def is_vowel(str: str) -> re.Match[str] | None: ...
+def expand_consonant(str: str) -> list[str]: ...
@@ -1,23 +1,56 @@
+from collections.abc import Iterable
+from concurrent.futures import Future
+from gettext import ngettext
 from typing import Optional
 
 from aqt import mw
 from aqt.qt import QMainWindow, Qt
 
 from .collection import get_collection
-from .model import add_notes, word_search
-from .qt import QtGui, searchwindow
+from .edict2.search import facets
+from .model import WordSearchModel, add_notes, get_examples_html
+from .qt import QtCore, QtGui, load_form
+from .service import SearchQuery, SearchResult, search_service
 from .settingswindow import SettingsWindow
 from .view import window_to_front
 
+# choices of the filters: label, configuration value, required and excluded facets
+parts_of_speech = [
+    ('Any part of speech', '', 0, 0),
+    ('Nouns', 'noun', facets['noun'], 0),
+    ('Verbs', 'verb', facets['verb'], 0),
+    ('Adjectives', 'adjective', facets['adjective'], 0),
+    ('Adverbs', 'adverb', facets['adverb'], 0),
+    ('Expressions', 'expression', facets['expression'], 0),
+    # proper nouns
+    ('Surnames', 'surname', facets['surname'], 0),
+    ('Given names', 'given', facets['given'], 0),
+    ('Full names', 'person', facets['person'], 0),
+    ('Places', 'place', facets['place'], 0),
+    ('Stations', 'station', facets['station'], 0),
+    ('Companies', 'company', facets['company'], 0),
+    ('Organizations', 'organization', facets['organization'], 0),
+]
+writings = [
+    ('Any writing', '', 0, 0),
+    ('With kanji', 'kanji', facets['kanji'], 0),
+    ('Kana only', 'kana', 0, facets['kanji']),
+]
+# example sentences shown for the current word
+search_examples = 3
+
 
 class SearchWindow(QMainWindow):
     instance = None
 
     @classmethod
-    def open(cls, pattern: Optional[str] = None) -> None:
+    def open(cls, pattern: Optional[str] = None, queue: Iterable[str] = (), is_proper_noun: bool = False) -> None:
+        """Search pattern, then each pattern of queue in turn after notes are added"""
         if cls.instance is None:
-            cls.instance = cls(pattern)
+            cls.instance = cls(pattern, queue, is_proper_noun)
         else:
+            cls.instance.is_proper_noun = is_proper_noun
+            cls.instance.enqueue(([pattern] if pattern is not None else []) + list(queue))
             window_to_front(cls.instance)
 
     def closeEvent(self, evt: QtGui.QCloseEvent) -> None:
@@ -25,25 +58,39 @@ class SearchWindow(QMainWindow):
         self.hide()
         evt.accept()
 
-    def __init__(self, pattern: Optional[str] = None) -> None:
+    def __init__(self, pattern: Optional[str] = None, queue: Iterable[str] = (), is_proper_noun: bool = False) -> None:
         QMainWindow.__init__(self)
+        # ambiguous patterns of a quick add waiting to be reviewed
+        self.queue = list(queue)
+        self.is_proper_noun = is_proper_noun
+        # facets set by the filters
+        self.required_facets = 0
+        self.excluded_facets = 0
+        # last search, whose result is shown when it is ready
+        self.query: Optional[SearchQuery] = None
+        self.model = WordSearchModel()
 
         if pattern is None:
             col = get_collection()
             pattern = col.conf.get('japanote_pattern', '')
 
-        self.form = searchwindow.Ui_MainWindow()
-        self.form.setupUi(self)  # type: ignore[no-untyped-call]
+        self.form = load_form('searchwindow').Ui_MainWindow()
+        self.form.setupUi(self)
         self.form.pattern.setText(pattern)
-        self.form.resultTable.setModel(word_search)
+        self.form.resultTable.setModel(self.model)
+        self.form.examplesLabel.hide()
+        self.setup_filters()
 
         # events
         self.form.pattern.returnPressed.connect(self.update_search)
         self.form.searchButton.clicked.connect(self.update_search)
         self.form.addButton.clicked.connect(self.on_add_notes)
         self.form.settingsButton.clicked.connect(SettingsWindow.open)
+        self.form.skipButton.clicked.connect(self.next_pattern)
+        self.form.resultTable.selectionModel().currentRowChanged.connect(self.update_examples)
 
         self.update_search()
+        self.update_queue()
 
         self.form.pattern.setClearButtonEnabled(True)
 
@@ -53,19 +100,90 @@ class SearchWindow(QMainWindow):
         if event.key() == Qt.Key.Key_Escape:
             self.close()
 
+    def setup_filters(self) -> None:
+        col = get_collection()
+        self.form.commonBox.setChecked(col.conf.get('japanote_commonOnly', False))
+        for box, choices, config_key in (
+            (self.form.partOfSpeechBox, parts_of_speech, 'japanote_partOfSpeech'),
+            (self.form.writingBox, writings, 'japanote_writing'),
+        ):
+            values = [value for _, value, _, _ in choices]
+            box.addItems([label for label, _, _, _ in choices])
+            value = col.conf.get(config_key, '')
+            box.setCurrentIndex(values.index(value) if value in values else 0)
+        self.update_filters()
+        self.form.commonBox.toggled.connect(self.on_change_filters)
+        self.form.partOfSpeechBox.currentIndexChanged.connect(self.on_change_filters)
+        self.form.writingBox.currentIndexChanged.connect(self.on_change_filters)
+
+    def update_filters(self) -> None:
+        _, part_of_speech, required, excluded = parts_of_speech[self.form.partOfSpeechBox.currentIndex()]
+        _, writing, writing_required, writing_excluded = writings[self.form.writingBox.currentIndex()]
+        required |= writing_required
+        excluded |= writing_excluded
+        if self.form.commonBox.isChecked():
+            required |= facets['common']
+        self.required_facets = required
+        self.excluded_facets = excluded
+        # save settings for persistence
+        col = get_collection()
+        col.conf['japanote_commonOnly'] = self.form.commonBox.isChecked()
+        col.conf['japanote_partOfSpeech'] = part_of_speech
+        col.conf['japanote_writing'] = writing
+
+    def on_change_filters(self) -> None:
+        self.update_filters()
+        self.update_search()
+
     def update_search(self) -> None:
         # get settings
         pattern = self.form.pattern.text()
-        # update results
-        word_search.search(pattern)
+        # update results, searched in the background; results of earlier searches are dropped
+        query = SearchQuery(pattern, self.is_proper_noun, self.required_facets, self.excluded_facets)
+        self.query = query
+
+        def on_done(future: Future[SearchResult]) -> None:
+            if query == self.query:
+                self.model.show(future.result())
+
+        assert mw is not None
+        mw.taskman.run_in_background(lambda: search_service.search(query), on_done)
         # save settings for persistence
         col = get_collection()
         col.conf['japanote_pattern'] = pattern
 
+    def update_examples(self, current: QtCore.QModelIndex) -> None:
+        # sentences of the current word, when the corpus is installed
+        text = get_examples_html(self.model.words[current.row()], search_examples) if current.isValid() else ''
+        self.form.examplesLabel.setText(text)
+        self.form.examplesLabel.setVisible(bool(text))
+
     def on_add_notes(self) -> None:
         rows = self.form.resultTable.selectionModel().selectedRows()
         words = [
-            word_search.words[index.row()]
+            self.model.words[index.row()]
             for index in rows
         ]
         add_notes(words)
+        if self.queue:
+            self.next_pattern()
+
+    def enqueue(self, patterns: list[str]) -> None:
+        # show the first pattern now, unless other ones are being reviewed
+        was_reviewing = bool(self.queue)
+        self.queue.extend(patterns)
+        if not was_reviewing:
+            self.next_pattern()
+
+    def next_pattern(self) -> None:
+        if self.queue:
+            self.form.pattern.setText(self.queue.pop(0))
+            self.update_search()
+        self.update_queue()
+
+    def update_queue(self) -> None:
+        n_patterns = len(self.queue)
+        text = ngettext('{} more word to review', '{} more words to review', n_patterns).format(n_patterns)
+        self.form.queueLabel.setText(text)
+        self.form.queueLabel.setVisible(bool(n_patterns))
+        self.form.skipButton.setVisible(bool(n_patterns))
@@ -0,0 +1,133 @@
+import re
+from collections.abc import Iterator
+from typing import NamedTuple
+
+from . import romkan
+from .edict2 import search, trace
+from .edict2.cache import QueryCache
+from .edict2.client import close_client, get_client
+from .edict2.complete import get_completer
+from .edict2.lookup import lookup, lookup_with_names
+from .edict2.search import Word, get_version
+
+pattern_separator = re.compile(r'[\s,;、，；]+')
+trailing_romaji = re.compile(r"[a-z'-]+$")
+
+
+class SearchQuery(NamedTuple):
+    pattern: str  # romaji, kana or kanji
+    is_proper_noun: bool = False
+    # facets that results must have and must not have (see Word.get_facets)
+    required_facets: int = 0
+    excluded_facets: int = 0
+
+
+class SearchResult(NamedTuple):
+    query: SearchQuery
+    words: tuple[Word, ...]
+    version: int  # of the dictionaries searched (see search.get_version)
+
+
+class SearchService:
+    """Searches of the dictionaries, safe to call from any thread
+
+    The service keeps no state about searches besides its cache: each call
+    gets its own result, and the dictionaries are only read once loaded. The
+    search window, the quick add, the HTTP API and background jobs can
+    therefore search at the same time.
+    """
+    def __init__(self) -> None:
+        # recent searches (unfiltered), shared by all the users of the service
+        self.cache: QueryCache[Word] = QueryCache()
+
+    def search(self, query: SearchQuery) -> SearchResult:
+        """Return the words matching a query"""
+        version = get_version()
+        words = self.search_words(query.pattern, query.is_proper_noun)
+        if query.required_facets or query.excluded_facets:
+            with trace.span('SearchService.filter'):
+                words = [word for word in words if word.has_facets(query.required_facets, query.excluded_facets)]
+        return SearchResult(query, tuple(words), version)
+
+    def search_words(self, pattern: str, is_proper_noun: bool = False) -> list[Word]:
+        """Return the words matching a pattern in romaji, kana or kanji"""
+        with trace.span('romkan.to_hiragana'):
+            word = romkan.to_hiragana(pattern.strip())
+        key = (word, is_proper_noun)
+        version = get_version()
+        words = self.cache.get(key, version)
+        if words is None:
+            words = list(self._search_words(word, is_proper_noun))
+            self.cache.put(key, version, words)
+        # the cached list is shared between threads
+        return list(words)
+
+    def _search_words(self, word: str, is_proper_noun: bool) -> Iterator[Word]:
+        # use the lookup daemon when it is running
+        client = get_client()
+        if client is not None:
+            try:
+                with trace.span('LookupClient.search'):
+                    words = client.search(word, is_proper_noun)
+                    if not words and not is_proper_noun:
+                        words = client.search(word, is_proper_noun=True)
+            except OSError:
+                close_client()
+            except LookupError:
+                pass  # error of the daemon: searched here instead
+            else:
+                yield from words
+                return
+        # words that are not in EDICT are looked up in ENAMDICT as well
+        yield from lookup(word, is_proper_noun=True) if is_proper_noun else lookup_with_names(word)
+
+    def resolve(self, patterns: list[str], is_proper_noun: bool = False) -> tuple[list[Word], list[str], list[str]]:
+        """Look up patterns and return the words matched unambiguously, the ambiguous patterns and those not found"""
+        words = []
+        ambiguous = []
+        not_found = []
+        with trace.span('resolve_patterns'):
+            for pattern in patterns:
+                results = self.search_words(pattern, is_proper_noun)
+                if not results:
+                    not_found.append(pattern)
+                elif len(results) > 1:
+                    ambiguous.append(pattern)
+                else:
+                    words.append(results[0])
+        return words, ambiguous, not_found
+
+    def complete(self, text: str) -> list[dict[str, str]]:
+        """Return suggestions for the pattern being typed at the end of text (best first)
+
+        There are none until EDICT is loaded and its completer built in the
+        background (see edict2.complete), which the first call starts.
+        """
+        completer = get_completer()
+        pattern = pattern_separator.split(text)[-1]
+        # romaji of the next kana is not converted yet (e.g. "tab")
+        prefix = trailing_romaji.sub('', romkan.to_hiragana(pattern))
+        edict = search.edict
+        if completer is None or edict is None or not prefix:
+            return []
+        suggestions = []
+        with trace.span('complete_pattern'):
+            for key in completer.complete(prefix):
+                word = next(edict.search(key), None)
+                if word is None:
+                    continue  # completer of the previous dictionaries
+                meanings = word.get_meanings()
+                suggestions.append({
+                    'key': key,
+                    'kana': word.kana if word.kana != key else '',
+                    'meaning': meanings[0] if meanings else '',
+                })
+        return suggestions
+
+
+def split_patterns(text: str) -> list[str]:
+    """Split text into patterns separated by spaces, commas or new lines (without repetitions)"""
+    return list(dict.fromkeys(pattern for pattern in pattern_separator.split(text) if pattern))
+
+
+search_service = SearchService()
@@ -1,12 +1,20 @@
+import html
+import os.path
+from concurrent.futures import Future
 from typing import Callable
 
 from aqt import mw
-from aqt.qt import QComboBox, QDialog, Qt
+from aqt.qt import QComboBox, QDialog, QInputDialog, Qt
+from aqt.utils import getFile, showInfo, showText, tooltip
 
 from .collection import get_collection
-from .qt import QtGui, settingswindow
+from .edict2 import trace
+from .qt import QtGui, load_form
 from .view import set_combobox_from_config, window_to_front
 
+# user_files is preserved by Anki when the add-on is updated
+timings_log = os.path.join(os.path.dirname(__file__), 'user_files', 'timings.log')
+
 
 class SettingsWindow(QDialog):
     instance = None
@@ -25,8 +33,8 @@ class SettingsWindow(QDialog):
 
     def __init__(self) -> None:
         QDialog.__init__(self)
-        self.form = settingswindow.Ui_japaNoteSettings()
-        self.form.setupUi(self)  # type: ignore[no-untyped-call]
+        self.form = load_form('settingswindow').Ui_japaNoteSettings()
+        self.form.setupUi(self)
 
         col = get_collection()
 
@@ -56,6 +64,7 @@ class SettingsWindow(QDialog):
             set_combobox_from_config(self.form.furiganaBox, field_names, 'japanote_furiganaField')
             set_combobox_from_config(self.form.definitionBox, field_names, 'japanote_definitionField')
             set_combobox_from_config(self.form.idBox, field_names, 'japanote_idField')
+            set_combobox_from_config(self.form.exampleBox, field_names, 'japanote_exampleField')
 
         # events
         self.set_onChange_combobox(self.form.deckBox, 'japanote_deck')
@@ -65,6 +74,23 @@ class SettingsWindow(QDialog):
         self.set_onChange_combobox(self.form.furiganaBox, 'japanote_furiganaField')
         self.set_onChange_combobox(self.form.definitionBox, 'japanote_definitionField')
         self.set_onChange_combobox(self.form.idBox, 'japanote_idField')
+        self.set_onChange_combobox(self.form.exampleBox, 'japanote_exampleField')
+
+        # maintenance
+        self.form.updateButton.clicked.connect(self.updateDictionary)
+        self.form.refreshButton.clicked.connect(self.refreshNotes)
+        self.form.coverageButton.clicked.connect(self.findMissingWords)
+        self.form.userDictionaryButton.clicked.connect(self.editUserDictionary)
+
+        # HTTP API
+        self.form.httpPortBox.setValue(col.conf.get('japanote_httpPort', 0))
+        self.form.httpPortBox.editingFinished.connect(self.onChangeHttpPort)
+
+        # diagnostics
+        self.form.traceBox.setChecked(trace.enabled)
+        self.form.traceBox.toggled.connect(self.onToggleTrace)
+        self.form.timingsButton.clicked.connect(self.showTimings)
+        self.form.memoryButton.clicked.connect(self.showMemory)
 
         self.show()
 
@@ -87,6 +113,107 @@ class SettingsWindow(QDialog):
         self.update_fieldboxes()
         self.update_warning()
 
+    def updateDictionary(self) -> None:
+        from .edict2.search import Edict, default_edict, load, set_edict
+        from .edict2.update import update_dictionary
+
+        diff_filename = getFile(self, 'Dictionary update', None, filter='*.diff')
+        if not diff_filename:
+            return
+        assert isinstance(diff_filename, str)  # not multi
+
+        # the new dictionary is loaded in the background, then replaces the
+        # current one without restarting Anki
+        def update() -> tuple[Edict, tuple[int, int, int]]:
+            counts = update_dictionary(default_edict, diff_filename)
+            return load(default_edict), counts
+
+        def on_done(future: Future[tuple[Edict, tuple[int, int, int]]]) -> None:
+            try:
+                edict, (added, changed, removed) = future.result()
+            except (OSError, ValueError) as e:
+                showInfo(f'Could not update the dictionary: {e}')
+                return
+            set_edict(edict)
+            tooltip(f'{added} entries added, {changed} changed, {removed} removed.')
+
+        assert mw is not None
+        mw.taskman.with_progress(update, on_done, label='Updating dictionary', parent=self)
+
+    def refreshNotes(self) -> None:
+        from .refresh import refresh_notes
+
+        refresh_notes()
+
+    def findMissingWords(self) -> None:
+        from .coverage import scan_collection
+
+        scan_collection()
+
+    def editUserDictionary(self) -> None:
+        from .edict2.userdict import get_user_dictionary
+
+        user_dictionary = get_user_dictionary()
+        words = {word.edict_entry.rstrip('\n'): word for word in user_dictionary.entries()}
+        text, ok = QInputDialog.getMultiLineText(
+            self, 'JapaNote: user dictionary',
+            'Entries in EDICT2 format, one per line (the JMdict ID is added if missing), e.g.\n'
+            '社内用語 [しゃないようご] /(n) company jargon/',
+            '\n'.join(words),
+        )
+        if not ok:
+            return
+        lines = dict.fromkeys(line.strip() for line in text.splitlines() if line.strip())
+        # only the entries that changed are removed and added again
+        for line, word in words.items():
+            if line not in lines:
+                user_dictionary.remove(word.get_sequence_id())
+        errors = []
+        for line in lines:
+            if line not in words:
+                try:
+                    user_dictionary.add_line(line)
+                except ValueError as e:
+                    errors.append(str(e))
+        if errors:
+            showInfo('Some entries were not added:\n' + '\n'.join(errors))
+        else:
+            tooltip(f'{len(user_dictionary.lines())} entries in the user dictionary.')
+
+    def onChangeHttpPort(self) -> None:
+        from .api import start_api
+
+        col = get_collection()
+        port = self.form.httpPortBox.value()
+        if port == col.conf.get('japanote_httpPort', 0):
+            return
+        col.conf['japanote_httpPort'] = port
+        start_api()
+
+    def onToggleTrace(self, checked: bool) -> None:
+        trace.enabled = checked
+        if checked:
+            trace.reset()
+
+    def showTimings(self) -> None:
+        os.makedirs(os.path.dirname(timings_log), exist_ok=True)
+        trace.write_report(timings_log)
+        report = f'<pre>{html.escape(trace.report())}</pre><p>Also written to {html.escape(timings_log)}</p>'
+        showText(report, parent=self, type='html', title='JapaNote timings', copyBtn=True)
+
+    def showMemory(self) -> None:
+        from .edict2 import memory
+        from .service import search_service
+
+        # following millions of references takes a few seconds
+        def on_done(future: Future[str]) -> None:
+            report = f'<pre>{html.escape(future.result())}</pre>'
+            showText(report, parent=self, type='html', title='JapaNote memory usage', copyBtn=True)
+
+        assert mw is not None
+        extra = {'search cache': search_service.cache}
+        mw.taskman.with_progress(lambda: memory.report(extra=extra), on_done, label='Measuring memory', parent=self)
+
     def update_fieldboxes(self) -> None:
         col = get_collection()
         model_name = col.conf['japanote_model']
@@ -100,12 +227,14 @@ class SettingsWindow(QDialog):
         self.form.furiganaBox.clear()
         self.form.definitionBox.clear()
         self.form.idBox.clear()
+        self.form.exampleBox.clear()
 
         self.form.kanjiBox.addItems(field_names)
         self.form.kanaBox.addItems(field_names)
         self.form.furiganaBox.addItems(field_names)
         self.form.definitionBox.addItems(field_names)
         self.form.idBox.addItems(field_names)
+        self.form.exampleBox.addItems(field_names)
 
     def update_warning(self) -> None:
         col = get_collection()